@@ -0,0 +1,89 @@
+import os
+import typing
+import collections
+
+from PyQt5.QtCore import QResource, QSize
+from PyQt5.QtGui import QIcon, QPixmap, QColor
+
+
+# binary resource file built from assets.qrc by make.bat - committed as rcc is part of Qt rather than PyQt5
+RESOURCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources.rcc')
+
+_registered = False
+
+# most recently used colours kept - colours may be computed from cell values, so the cache is bounded
+COLOUR_CACHE_SIZE = 256
+
+# shared instances keyed by resource path, (path, width, height) and colour value, colours least recently used first
+_icons = {}  # type: typing.Dict[str, QIcon]
+_pixmaps = {}  # type: typing.Dict[typing.Tuple[str, int, int], QPixmap]
+_colours = collections.OrderedDict()  # type: collections.OrderedDict
+
+
+def register_resources() -> None:
+    """ Register the icons used by the views with Qt's resource system - resources.rcc is memory mapped by Qt if it has
+        been built, otherwise the compiled resources module is imported. Called on first icon access and before
+        designer forms are set up, as their icons refer to the resources directly """
+
+    global _registered
+    if _registered:
+        return
+
+    if not (os.path.exists(RESOURCE_FILE) and QResource.registerResource(RESOURCE_FILE)):
+        from . import resources
+    _registered = True
+
+
+def icon(path: str) -> QIcon:
+    """ Return the shared icon for a resource path such as :record/add, registering resources first if needed """
+    cached = _icons.get(path)
+    if cached is None:
+        register_resources()
+        cached = _icons[path] = QIcon(path)
+    return cached
+
+
+def pixmap(path: str, size: typing.Union[QSize, int]) -> QPixmap:
+    """ Return the shared pixmap of an icon rendered at the given size, eg. a view's iconSize() """
+    if isinstance(size, int):
+        size = QSize(size, size)
+
+    key = (path, size.width(), size.height())
+    cached = _pixmaps.get(key)
+    if cached is None:
+        cached = _pixmaps[key] = icon(path).pixmap(size)
+    return cached
+
+
+def colour(value: typing.Any) -> typing.Optional[QColor]:
+    """ Return the shared colour for a name such as '#ff0000' or 'red', an (r, g, b[, a]) tuple or list or an RGBA
+        integer - colours and None are returned unchanged. Booleans, such as the False of `value > 0 and 'red'`, are
+        not colours and return None """
+
+    if value is None or isinstance(value, QColor):
+        return value
+    # bools are ints, True would otherwise be the RGBA colour 1
+    if isinstance(value, bool):
+        return None
+
+    # unhashable values such as lists are converted on every call
+    try:
+        cached = _colours.get(value)
+    except TypeError:
+        return _to_colour(value)
+
+    if cached is None:
+        cached = _colours[value] = _to_colour(value)
+        if len(_colours) > COLOUR_CACHE_SIZE:
+            _colours.popitem(last=False)
+    else:
+        _colours.move_to_end(value)
+    return cached
+
+
+def _to_colour(value: typing.Any) -> QColor:
+    if isinstance(value, (tuple, list)):
+        return QColor(*value)
+    elif isinstance(value, int):
+        return QColor.fromRgba(value)
+    return QColor(value)
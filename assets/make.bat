@@ -1 +1,3 @@
 pyrcc5 -o resources.py assets.qrc
+rem resources.rcc is committed - rebuilding it needs rcc from a Qt installation as it does not ship with PyQt5
+rcc -binary -o resources.rcc assets.qrc
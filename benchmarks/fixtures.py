@@ -0,0 +1,162 @@
+import os
+import random
+import datetime
+
+from PyQt5.QtCore import QModelIndex
+from PyQt5.QtSql import QSqlDatabase, QSqlQuery
+from PyQt5.QtWidgets import QWidget, QFormLayout, QLineEdit, QVBoxLayout
+
+from ..db.model import DatabaseModel, RelatedDatabaseModel, BooleanDatabaseField
+from ..db.exceptions import SQLError
+from ..db.connection import DEFAULT_CONNECTION
+from ..views.record_form import RecordFormView
+from ..views.record_table import RecordTableView
+
+
+# bump when the generated schema or data changes so cached databases are rebuilt
+SCHEMA_VERSION = 1
+
+# orders which are given line items - only the first orders are opened in forms
+ORDERS_WITH_LINES = 1000
+LINES_PER_ORDER = 5
+
+CITIES = ['Perth', 'Sydney', 'Hobart', 'Darwin', 'Adelaide', 'Brisbane', 'Melbourne', 'Canberra']
+PRODUCTS = ['Widget', 'Gadget', 'Sprocket', 'Flange', 'Gizmo']
+
+
+def database_path(data_dir: str, rows: int) -> str:
+    return os.path.join(data_dir, 'orders-{0}-v{1}.sqlite'.format(rows, SCHEMA_VERSION))
+
+
+def _exec(query: QSqlQuery, statement: str=None, batch: bool=False) -> None:
+    if statement is not None:
+        executed = query.exec_(statement)
+    else:
+        executed = query.execBatch() if batch else query.exec_()
+    if not executed:
+        raise SQLError(query.lastError().text())
+
+
+def generate_database(path: str, rows: int, chunk_size: int=50000) -> None:
+    """ Generate an orders database with the given number of orders - the same seed is used for every run so results
+        are comparable between revisions """
+
+    connection = QSqlDatabase.addDatabase('QSQLITE', 'benchmark-generate')
+    connection.setDatabaseName(path)
+    if not connection.open():
+        raise SQLError(connection.lastError().text())
+
+    try:
+        query = QSqlQuery(connection)
+        _exec(query, 'CREATE TABLE orders (id INTEGER PRIMARY KEY, name TEXT, city TEXT, amount REAL, paid BOOLEAN, '
+                     'created DATE, notes TEXT)')
+        _exec(query, 'CREATE TABLE order_lines (id INTEGER PRIMARY KEY, order_id INTEGER REFERENCES orders (id), '
+                     'product TEXT, quantity INTEGER, price REAL)')
+        _exec(query, 'CREATE INDEX order_lines_order_id ON order_lines (order_id)')
+
+        generator = random.Random(rows)
+        start_date = datetime.date(2015, 1, 1)
+
+        connection.transaction()
+        query.prepare('INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?, ?)')
+        for first in range(1, rows + 1, chunk_size):
+            ids = list(range(first, min(first + chunk_size, rows + 1)))
+            query.addBindValue(ids)
+            query.addBindValue(['Customer {0}'.format(generator.randint(1, rows)) for id_value in ids])
+            query.addBindValue([generator.choice(CITIES) for id_value in ids])
+            query.addBindValue([round(generator.uniform(1, 5000), 2) for id_value in ids])
+            query.addBindValue([generator.random() < 0.7 for id_value in ids])
+            query.addBindValue([(start_date + datetime.timedelta(days=generator.randint(0, 3000))).isoformat()
+                                for id_value in ids])
+            query.addBindValue([' '.join(['Order notes for order {0}.'.format(id_value)] * generator.randint(1, 4))
+                                for id_value in ids])
+            _exec(query, batch=True)
+
+        order_ids = [order_id for order_id in range(1, min(rows, ORDERS_WITH_LINES) + 1)
+                     for line in range(LINES_PER_ORDER)]
+        query.prepare('INSERT INTO order_lines (order_id, product, quantity, price) VALUES (?, ?, ?, ?)')
+        query.addBindValue(order_ids)
+        query.addBindValue([generator.choice(PRODUCTS) for order_id in order_ids])
+        query.addBindValue([generator.randint(1, 20) for order_id in order_ids])
+        query.addBindValue([round(generator.uniform(1, 200), 2) for order_id in order_ids])
+        _exec(query, batch=True)
+        connection.commit()
+    finally:
+        connection.close()
+        del connection
+        QSqlDatabase.removeDatabase('benchmark-generate')
+
+
+def open_database(data_dir: str, rows: int) -> QSqlDatabase:
+    """ Point the default connection at the database for the given number of rows, generating it if needed """
+    path = database_path(data_dir, rows)
+    if not os.path.exists(path):
+        os.makedirs(data_dir, exist_ok=True)
+        try:
+            generate_database(path, rows)
+        except:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+    if QSqlDatabase.contains(DEFAULT_CONNECTION):
+        database = QSqlDatabase.database(DEFAULT_CONNECTION, False)
+        database.close()
+    else:
+        database = QSqlDatabase.addDatabase('QSQLITE')
+
+    database.setDatabaseName(path)
+    if not database.open():
+        raise SQLError(database.lastError().text())
+    return database
+
+
+def fetch_all(model) -> None:
+    """ Fetch every row of a lazily populated model """
+    while model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+
+
+class OrderModel(DatabaseModel):
+    table = 'orders'
+    auto_populate_id = False
+
+    def __init__(self):
+        super().__init__()
+        self.set_field(BooleanDatabaseField(self.paid))
+
+
+class OrderLineModel(RelatedDatabaseModel):
+    table = 'order_lines'
+    auto_populate_id = False
+    id_field = 'order_id'
+
+
+class OrderLineTableView(RecordTableView):
+    model = OrderLineModel
+    show_record_toolbar = False
+    show_filter_toolbar = False
+
+
+class OrderForm(object):
+    """ Form class equivalent to one compiled by pyuic5 so the benchmarks do not depend on a designer file """
+
+    def setupUi(self, window):
+        widget = QWidget(window)
+        layout = QVBoxLayout(widget)
+        fields = QFormLayout()
+        layout.addLayout(fields)
+
+        for name in ('id', 'name', 'city', 'amount', 'created', 'notes'):
+            editor = QLineEdit(widget)
+            setattr(self, name, editor)
+            fields.addRow(name.title(), editor)
+
+        self.lines_placeholder = QWidget(widget)
+        layout.addWidget(self.lines_placeholder)
+        window.setCentralWidget(widget)
+
+
+class OrderFormView(RecordFormView):
+    ui_class = OrderForm
+    subviews = {'lines': OrderLineTableView}
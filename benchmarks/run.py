@@ -0,0 +1,121 @@
+""" Headless benchmarks of models, proxies and views against generated SQLite databases
+
+    python -m [package].benchmarks.run --rows 10000 100000 --output results.json
+    python -m [package].benchmarks.run --compare baseline.json results.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+
+# views are created offscreen unless a platform is chosen
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from PyQt5.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+from PyQt5.QtWidgets import QApplication
+
+from .fixtures import open_database
+from .suite import benchmarks
+
+
+DEFAULT_ROWS = [10000, 100000]
+
+# measurements slower than the baseline by more than this ratio are reported as regressions
+REGRESSION_RATIO = 1.2
+
+
+def revision() -> str:
+    """ Return the git revision of the source tree, if available """
+    try:
+        output = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+    return output.decode().strip()
+
+
+def run(rows: list, names: list, data_dir: str) -> dict:
+    """ Run the named benchmarks for each database size and return the results """
+    results = {
+        'meta': {
+            'revision': revision(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'qt': QT_VERSION_STR,
+            'pyqt': PYQT_VERSION_STR,
+            'platform': platform.platform(),
+        },
+        'results': {},
+    }
+
+    for row_count in rows:
+        open_database(data_dir, row_count)
+        for name in names:
+            print('{0} ({1} rows)...'.format(name, row_count), file=sys.stderr)
+            measurements = benchmarks[name](row_count)
+            results['results'].setdefault(name, {})[str(row_count)] = measurements
+
+    return results
+
+
+def compare(baseline: dict, current: dict) -> list:
+    """ Return (benchmark, rows, measurement, baseline seconds, current seconds, ratio) for every timing present in
+        both results """
+
+    comparisons = []
+    for name, sizes in current['results'].items():
+        for row_count, measurements in sizes.items():
+            baseline_measurements = baseline['results'].get(name, {}).get(row_count, {})
+            for measurement, seconds in measurements.items():
+                baseline_seconds = baseline_measurements.get(measurement)
+                if not measurement.endswith('_seconds') or not baseline_seconds:
+                    continue
+                comparisons.append((name, row_count, measurement, baseline_seconds, seconds, seconds / baseline_seconds))
+    return comparisons
+
+
+def main(arguments: list=None) -> int:
+    parser = argparse.ArgumentParser(description='Run headless model and view benchmarks')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='database sizes to benchmark')
+    parser.add_argument('--only', nargs='+', choices=list(benchmarks), default=list(benchmarks),
+                        help='benchmarks to run')
+    parser.add_argument('--output', help='file to write JSON results to, stdout if not given')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'qt-db-benchmarks'),
+                        help='directory for generated databases, reused between runs')
+    parser.add_argument('--compare', nargs=2, metavar=('BASELINE', 'CURRENT'),
+                        help='compare two result files instead of running benchmarks')
+    options = parser.parse_args(arguments)
+
+    if options.compare:
+        with open(options.compare[0]) as baseline_file, open(options.compare[1]) as current_file:
+            comparisons = compare(json.load(baseline_file), json.load(current_file))
+
+        regressions = 0
+        for name, row_count, measurement, baseline_seconds, seconds, ratio in comparisons:
+            flag = ''
+            if ratio > REGRESSION_RATIO:
+                flag = '  REGRESSION'
+                regressions += 1
+            print('{0:<14} {1:>8} {2:<36} {3:>10.4f} {4:>10.4f} {5:>6.2f}x{6}'.format(
+                name, row_count, measurement, baseline_seconds, seconds, ratio, flag))
+        return 1 if regressions else 0
+
+    application = QApplication.instance() or QApplication(sys.argv[:1])
+    results = run(options.rows, options.only, options.data_dir)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,59 @@
+""" Cold start of a RecordTableView - import time per module and time to first paint
+
+    python -m [package].benchmarks.startup --rows 10000 --output startup.json
+
+Run in a fresh process, modules imported before the profiler is installed are not measured.
+"""
+
+import os
+import sys
+import argparse
+import tempfile
+
+from ..utils.startup import StartupProfiler
+
+profiler = StartupProfiler().install()
+
+# views are created offscreen unless a platform is chosen
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+
+def main(arguments: list=None) -> int:
+    parser = argparse.ArgumentParser(description='Profile imports and time to first paint of a record table')
+    parser.add_argument('--rows', type=int, default=10000, help='database size')
+    parser.add_argument('--output', help='file to write JSON results to, a text report is printed if not given')
+    parser.add_argument('--data-dir', default=os.path.join(tempfile.gettempdir(), 'qt-db-benchmarks'),
+                        help='directory for generated databases, reused between runs')
+    options = parser.parse_args(arguments)
+
+    from PyQt5.QtWidgets import QApplication
+    from .fixtures import OrderModel, open_database
+    from ..views.record_table import RecordTableView
+    profiler.mark('modules imported')
+
+    application = QApplication.instance() or QApplication(sys.argv[:1])
+    open_database(options.data_dir, options.rows)
+    profiler.mark('database opened')
+
+    class OrderTableView(RecordTableView):
+        model = OrderModel
+
+    view = OrderTableView()
+    view.data_model.select()
+    profiler.mark('view created')
+
+    profiler.uninstall()
+    profiler.watch_first_paint(view, callback=lambda name, seconds: application.quit())
+    view.show()
+    application.exec_()
+
+    if options.output:
+        with open(options.output, 'w') as output_file:
+            output_file.write(profiler.json())
+    else:
+        print(profiler.report())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
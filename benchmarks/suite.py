@@ -0,0 +1,198 @@
+import time
+import typing
+import statistics
+
+from PyQt5.QtCore import Qt, QModelIndex
+from PyQt5.QtSql import QSqlTableModel
+from PyQt5.QtWidgets import QApplication
+
+from ..db.proxy import CustomSortFilterProxyModel
+from ..views.toolbar.filter_toolbar import FilterToolbar
+from .fixtures import OrderModel, OrderFormView, fetch_all
+
+
+# benchmark functions in run order, keyed by name - each takes the row count and returns its measurements
+benchmarks = {}
+
+# maximum number of rows read per role by the data() benchmark
+DATA_SAMPLE_ROWS = 20000
+
+# roles requested by views when painting a cell
+DATA_ROLES = [
+    ('display', Qt.DisplayRole),
+    ('edit', Qt.EditRole),
+    ('decoration', Qt.DecorationRole),
+    ('foreground', Qt.ForegroundRole),
+    ('background', Qt.BackgroundRole),
+    ('check_state', Qt.CheckStateRole),
+    ('alignment', Qt.TextAlignmentRole),
+]
+
+
+def benchmark(fn: typing.Callable[[int], dict]) -> typing.Callable[[int], dict]:
+    """ Register a benchmark """
+    benchmarks[fn.__name__] = fn
+    return fn
+
+
+def timed(fn: typing.Callable[[], typing.Any]) -> float:
+    """ Return the seconds taken to call fn """
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def process_events() -> None:
+    QApplication.processEvents()
+
+
+def loaded_proxy() -> CustomSortFilterProxyModel:
+    model = OrderModel()
+    model.select()
+    fetch_all(model)
+    proxy = CustomSortFilterProxyModel()
+    proxy.setSourceModel(model)
+
+    # the proxy maps rows lazily - map them now as a view would so filtering is measured rather than deferred
+    proxy.rowCount()
+    return proxy
+
+
+@benchmark
+def model_select(rows: int) -> dict:
+    """ DatabaseModel construction, select() of the first batch and fetching every row """
+    results = {}
+    model = None
+
+    def construct():
+        nonlocal model
+        model = OrderModel()
+
+    results['construct_seconds'] = timed(construct)
+    results['select_seconds'] = timed(model.select)
+    results['fetch_all_seconds'] = timed(lambda: fetch_all(model))
+    results['rows'] = model.rowCount()
+    return results
+
+
+@benchmark
+def data_roles(rows: int) -> dict:
+    """ data() throughput per role over every column of a sample of rows """
+    model = OrderModel()
+    model.select()
+    while model.rowCount() < min(rows, DATA_SAMPLE_ROWS) and model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+
+    indexes = [model.index(row, column) for row in range(min(model.rowCount(), DATA_SAMPLE_ROWS))
+               for column in range(model.columnCount())]
+
+    results = {'calls_per_role': len(indexes)}
+    for name, role in DATA_ROLES:
+        data = model.data
+        results['{0}_seconds'.format(name)] = timed(lambda: [data(index, role) for index in indexes])
+    return results
+
+
+@benchmark
+def filtering(rows: int) -> dict:
+    """ Filtering through FilterToolbar field callbacks, the any field search index and boolean filters """
+    proxy = loaded_proxy()
+    results = {}
+
+    toolbar = FilterToolbar(['name', 'city'], proxy)
+    toolbar.filter_field.setCurrentText('City')
+    results['field_filter_seconds'] = timed(lambda: (toolbar.filter.setText('Perth'), proxy.rowCount()))
+    results['field_filter_rows'] = proxy.rowCount()
+    results['field_filter_clear_seconds'] = timed(lambda: (toolbar.filter.setText(''), proxy.rowCount()))
+    proxy.remove_filter_function('filter')
+
+    search_toolbar = None
+
+    def build_search():
+        nonlocal search_toolbar
+        search_toolbar = FilterToolbar(['name', 'city'], proxy, any_field=True)
+
+    results['search_index_build_seconds'] = timed(build_search)
+    results['any_field_filter_seconds'] = timed(lambda: (search_toolbar.filter.setText('Perth'), proxy.rowCount()))
+    results['any_field_filter_rows'] = proxy.rowCount()
+    search_toolbar.filter.setText('')
+
+    def boolean_filter():
+        proxy.set_boolean_filter('paid', True)
+        proxy.rowCount()
+
+    results['boolean_filter_seconds'] = timed(boolean_filter)
+    results['boolean_filter_rows'] = proxy.rowCount()
+    return results
+
+
+@benchmark
+def sorting(rows: int) -> dict:
+    """ Sorting the proxy by text, numeric and date columns """
+    proxy = loaded_proxy()
+    model = proxy.sourceModel()
+
+    results = {}
+    for field in ('name', 'amount', 'created'):
+        column = getattr(model, field).index
+        results['{0}_ascending_seconds'.format(field)] = timed(lambda: proxy.sort(column, Qt.AscendingOrder))
+        results['{0}_descending_seconds'.format(field)] = timed(lambda: proxy.sort(column, Qt.DescendingOrder))
+    return results
+
+
+@benchmark
+def add_records(rows: int, count: int=1000) -> dict:
+    """ add_record() and submitAll() throughput - the added records are deleted afterwards """
+    model = OrderModel()
+    model.setEditStrategy(QSqlTableModel.OnManualSubmit)
+    model.select()
+
+    first_id = rows + 1
+    ids = list(range(first_id, first_id + count))
+
+    def add():
+        for id_value in ids:
+            model.add_record(id=id_value, name='Benchmark', city='Perth', amount=1.0, paid=False)
+
+    results = {'records': count}
+    results['add_record_seconds'] = timed(add)
+    results['submit_all_seconds'] = timed(model.submitAll)
+    model.delete_records(ids)
+    return results
+
+
+@benchmark
+def record_form(rows: int, navigations: int=50) -> dict:
+    """ RecordFormView open time and subview refresh latency when navigating between records """
+    model = OrderModel()
+    model.select()
+    results = {}
+    form = None
+
+    def open_form():
+        nonlocal form
+        form = OrderFormView(model=model)
+        form.set_record_index(model.index(0, 0))
+        form.show()
+        process_events()
+
+    results['open_seconds'] = timed(open_form)
+
+    latencies = []
+    for row in range(1, min(navigations, model.rowCount()) + 1):
+        latencies.append(timed(lambda: (form.data_mapper.setCurrentIndex(row), process_events())))
+
+    results['update_subviews_mean_seconds'] = statistics.mean(latencies)
+    results['update_subviews_max_seconds'] = max(latencies)
+    form.close()
+
+    def reopen():
+        nonlocal form
+        form = OrderFormView.acquire(model=model)
+        form.set_record_index(model.index(0, 0))
+        form.show()
+        process_events()
+
+    results['reopen_seconds'] = timed(reopen)
+    form.close()
+    return results
@@ -0,0 +1,406 @@
+import abc
+import json
+import typing
+import logging
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+from PyQt5.QtSql import QSqlDatabase, QSqlQuery, QSqlDriver
+
+from ..exceptions import ImproperlyConfigured
+from ..utils.abstract import QObjectABCMeta
+from .exceptions import SQLError
+from .instrumentation import execute
+
+if typing.TYPE_CHECKING:
+    from .model import DatabaseModel
+
+
+logger = logging.getLogger('changefeed')
+
+# operations reported by change feeds
+INSERT, UPDATE, DELETE = 'insert', 'update', 'delete'
+
+
+class ChangeFeed(QObject, metaclass=QObjectABCMeta):
+    """ Source of row changes made to tables by any client - backends install triggers on the tables to follow and
+        report changes by table and primary key, subclasses implement install(), start() and stop()
+        Params -
+            connection - connection to receive changes on, the default connection if not given
+        Events -
+            changed - fired with the table name, operation (insert, update or delete) and primary keys of changed
+                      rows"""
+
+    changed = pyqtSignal(str, str, list)
+
+    def __init__(self, connection: QSqlDatabase=None) -> None:
+        super().__init__()
+        self.connection = connection or QSqlDatabase.database()
+
+    @abc.abstractmethod
+    def install(self, table: str, id_field: str='id') -> None:
+        """ Create the triggers which report changes to a table - only required once per database """
+
+    @abc.abstractmethod
+    def start(self) -> None:
+        """ Start receiving changes - starting a started feed has no effect """
+
+    @abc.abstractmethod
+    def stop(self) -> None:
+        """ Stop receiving changes - stopping a stopped feed has no effect """
+
+    def _exec(self, statement: str) -> None:
+        query = QSqlQuery(self.connection)
+        if not execute(query, statement, connection=self.connection):
+            raise SQLError(query.lastError().text())
+
+    def _identifier(self, name: str, identifier_type: int=QSqlDriver.FieldName) -> str:
+        return self.connection.driver().escapeIdentifier(name, identifier_type)
+
+
+class NotifyChangeFeed(ChangeFeed):
+    """ PostgreSQL change feed - triggers publish each changed row with NOTIFY and the driver delivers them as they
+        happen, no polling
+        Params -
+            connection - QPSQL connection to listen on
+            channel - notification channel shared by the followed tables"""
+
+    def __init__(self, connection: QSqlDatabase=None, channel: str='table_changes') -> None:
+        super().__init__(connection)
+        if self.connection.driverName() != 'QPSQL':
+            raise ImproperlyConfigured('NotifyChangeFeed requires a QPSQL connection')
+        if not self.connection.driver().hasFeature(QSqlDriver.EventNotifications):
+            raise ImproperlyConfigured('The database driver does not support notifications')
+        self.channel = channel
+
+    def install(self, table: str, id_field: str='id') -> None:
+        self._exec("""
+            CREATE OR REPLACE FUNCTION notify_row_change() RETURNS trigger AS $$
+            DECLARE
+                row_data jsonb := to_jsonb(CASE WHEN TG_OP = 'DELETE' THEN OLD ELSE NEW END);
+            BEGIN
+                PERFORM pg_notify(TG_ARGV[1], json_build_object(
+                    'table', TG_TABLE_NAME, 'operation', lower(TG_OP), 'id', row_data -> TG_ARGV[0])::text);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql""")
+
+        trigger = self._identifier('{0}_notify_row_change'.format(table))
+        self._exec('DROP TRIGGER IF EXISTS {0} ON {1}'.format(trigger, self._identifier(table, QSqlDriver.TableName)))
+        self._exec("CREATE TRIGGER {0} AFTER INSERT OR UPDATE OR DELETE ON {1} FOR EACH ROW "
+                   "EXECUTE PROCEDURE notify_row_change('{2}', '{3}')".format(
+                        trigger, self._identifier(table, QSqlDriver.TableName), id_field, self.channel))
+
+    def start(self) -> None:
+        driver = self.connection.driver()
+        if self.channel in driver.subscribedToNotifications():
+            return
+        driver.notification[str, QSqlDriver.NotificationSource, 'QVariant'].connect(self._notification)
+        if not driver.subscribeToNotification(self.channel):
+            driver.notification[str, QSqlDriver.NotificationSource, 'QVariant'].disconnect(self._notification)
+            raise SQLError(driver.lastError().text())
+
+    def stop(self) -> None:
+        driver = self.connection.driver()
+        if self.channel not in driver.subscribedToNotifications():
+            return
+        driver.unsubscribeFromNotification(self.channel)
+        driver.notification[str, QSqlDriver.NotificationSource, 'QVariant'].disconnect(self._notification)
+
+    # driver notification event handler
+    def _notification(self, channel: str, source: int, payload: typing.Any) -> None:
+        if channel != self.channel:
+            return
+        try:
+            change = json.loads(payload)
+            self.changed.emit(change['table'], change['operation'], [change['id']])
+        except (TypeError, ValueError, KeyError):
+            logger.warning('ignoring malformed change notification %r', payload)
+
+
+class ChangelogChangeFeed(ChangeFeed):
+    """ Change feed for databases without notifications, eg. SQLite - triggers append changed rows to a changelog table
+        which is polled for entries newer than the last one read, so each poll is a single indexed range query. SQLite
+        connections see a snapshot of the database while a model on them has rows left to fetch, so give the feed its
+        own connection, and use WAL journal mode so other clients can write while models are partially fetched
+        Params -
+            connection - connection to poll on, changed rows are also read on it
+            interval - milliseconds between polls
+            changelog_table - name of the changelog table"""
+
+    def __init__(self, connection: QSqlDatabase=None, interval: int=500, changelog_table: str='changelog') -> None:
+        super().__init__(connection)
+        self.changelog_table = changelog_table
+        self.last_sequence = None  # type: int
+
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.poll)
+
+    def _create_changelog(self) -> None:
+        self._exec('CREATE TABLE IF NOT EXISTS {0} (sequence INTEGER PRIMARY KEY AUTOINCREMENT, '
+                   'table_name TEXT NOT NULL, operation TEXT NOT NULL, row_id, '
+                   'created TIMESTAMP DEFAULT CURRENT_TIMESTAMP)'.format(
+                        self._identifier(self.changelog_table, QSqlDriver.TableName)))
+
+    def install(self, table: str, id_field: str='id') -> None:
+        self._create_changelog()
+
+        changelog = self._identifier(self.changelog_table, QSqlDriver.TableName)
+        id_field = self._identifier(id_field)
+        for operation, row in ((INSERT, 'NEW'), (UPDATE, 'NEW'), (DELETE, 'OLD')):
+            trigger = self._identifier('{0}_changelog_{1}'.format(table, operation))
+            self._exec("CREATE TRIGGER IF NOT EXISTS {0} AFTER {1} ON {2} BEGIN INSERT INTO {3} "
+                       "(table_name, operation, row_id) VALUES ('{4}', '{5}', {6}.{7}); END".format(
+                            trigger, operation.upper(), self._identifier(table, QSqlDriver.TableName), changelog, table,
+                            operation, row, id_field))
+
+    def start(self) -> None:
+        # only changes made after starting are reported
+        if self.last_sequence is None:
+            self._create_changelog()
+            query = QSqlQuery(self.connection)
+            if not execute(query, 'SELECT MAX(sequence) FROM {0}'.format(
+                    self._identifier(self.changelog_table, QSqlDriver.TableName)), connection=self.connection):
+                raise SQLError(query.lastError().text())
+            query.next()
+            self.last_sequence = query.value(0) or 0
+        self.timer.start()
+
+    def stop(self) -> None:
+        self.timer.stop()
+
+    def poll(self) -> None:
+        """ Read changelog entries added since the last poll and report them, grouped by table and operation """
+        query = QSqlQuery(self.connection)
+        query.setForwardOnly(True)
+        query.prepare('SELECT sequence, table_name, operation, row_id FROM {0} WHERE sequence > ? ORDER BY sequence'
+                      .format(self._identifier(self.changelog_table, QSqlDriver.TableName)))
+        query.addBindValue(self.last_sequence or 0)
+        if not execute(query, connection=self.connection):
+            logger.warning('unable to read changelog: %s', query.lastError().text())
+            return
+
+        # consecutive entries for the same table and operation are reported together
+        groups = []
+        while query.next():
+            self.last_sequence = query.value(0)
+            key = (query.value(1), query.value(2))
+            if not groups or groups[-1][0] != key:
+                groups.append((key, []))
+            groups[-1][1].append(query.value(3))
+
+        for (table, operation), ids in groups:
+            self.changed.emit(table, operation, ids)
+
+    def prune(self, max_age: int=3600) -> None:
+        """ Delete changelog entries older than max_age seconds - every client must poll more often than this """
+        query = QSqlQuery(self.connection)
+        query.prepare("DELETE FROM {0} WHERE created < datetime('now', ?)".format(
+            self._identifier(self.changelog_table, QSqlDriver.TableName)))
+        query.addBindValue('-{0} seconds'.format(int(max_age)))
+        if not execute(query, connection=self.connection):
+            raise SQLError(query.lastError().text())
+
+
+class ChangeSubscription(QObject):
+    """ Applies changes reported by a feed to a model - changes arriving within the delay are coalesced, changed rows
+        are re-read by primary key and patched in place and deleted rows are excluded from the model. Inserted rows
+        matching the model's filter, bursts larger than reload_threshold and rows entering or leaving the filter
+        re-select the model, as rows can only be added to a model by a select. Changes to rows with unsubmitted edits
+        are kept until the edits are submitted or reverted
+        Params -
+            model - database model to keep up to date
+            feed - change feed reporting changes to the model's table
+            delay - milliseconds to wait for further changes before applying them
+            reload_threshold - number of changed rows above which the model is re-selected rather than patched"""
+
+    def __init__(self, model: 'DatabaseModel', feed: ChangeFeed, delay: int=100, reload_threshold: int=500) -> None:
+        super().__init__()
+        self.model = model
+        self.feed = feed
+        self.reload_threshold = reload_threshold
+
+        self.changed_ids = set()  # type: typing.Set[typing.Any]
+        self.inserted_ids = set()  # type: typing.Set[typing.Any]
+        self.deleted_ids = set()  # type: typing.Set[typing.Any]
+        self.reload = False
+        self._id_rows = None  # type: typing.Dict[typing.Any, int]
+
+        # changes held back by unsubmitted edits - queued again when the model's edits are submitted or reverted
+        self.held_changed_ids = set()  # type: typing.Set[typing.Any]
+        self.held_deleted_ids = set()  # type: typing.Set[typing.Any]
+        self.held_reload = False
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(delay)
+        self.timer.timeout.connect(self.apply)
+
+        feed.changed.connect(self._changed)
+        model.modelReset.connect(self._model_reset)
+        model.rowsInserted.connect(self._rows_moved)
+        model.rowsRemoved.connect(self._rows_moved)
+        model.rows_deleted.connect(self._rows_moved)
+        model.edits_resolved.connect(self._edits_resolved)
+
+    def cancel(self) -> None:
+        """ Stop applying changes to the model """
+        self.timer.stop()
+        self.feed.changed.disconnect(self._changed)
+        self.model.modelReset.disconnect(self._model_reset)
+        self.model.rowsInserted.disconnect(self._rows_moved)
+        self.model.rowsRemoved.disconnect(self._rows_moved)
+        self.model.rows_deleted.disconnect(self._rows_moved)
+        self.model.edits_resolved.disconnect(self._edits_resolved)
+
+    # feed changed event handler
+    def _changed(self, table: str, operation: str, ids: typing.List[typing.Any]) -> None:
+        if table != self.model.tableName():
+            return
+
+        # the last operation reported for a row is applied
+        self.held_changed_ids.difference_update(ids)
+        self.held_deleted_ids.difference_update(ids)
+        if operation == DELETE:
+            self.changed_ids.difference_update(ids)
+            self.inserted_ids.difference_update(ids)
+            self.deleted_ids.update(ids)
+        else:
+            self.deleted_ids.difference_update(ids)
+            (self.inserted_ids if operation == INSERT else self.changed_ids).update(ids)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    # model row change event handler - row positions are looked up again on the next change
+    def _rows_moved(self, *args: typing.Any) -> None:
+        self._id_rows = None
+
+    # model reset event handler - the select read every row, including those held back
+    def _model_reset(self) -> None:
+        self._id_rows = None
+        self.held_changed_ids = set()
+        self.held_deleted_ids = set()
+        self.held_reload = False
+
+    # model edits submitted or reverted event handler
+    def _edits_resolved(self) -> None:
+        if not (self.held_changed_ids or self.held_deleted_ids or self.held_reload):
+            return
+
+        self.changed_ids.update(self.held_changed_ids)
+        self.deleted_ids.update(self.held_deleted_ids)
+        self.reload = self.reload or self.held_reload
+        self.held_changed_ids = set()
+        self.held_deleted_ids = set()
+        self.held_reload = False
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def id_rows(self) -> typing.Dict[typing.Any, int]:
+        """ Return the row of each loaded primary key - rows deleted from the model are not included """
+        if self._id_rows is None:
+            model = self.model
+            id_column = model.fieldIndex(model.id_field_name)
+            self._id_rows = {model.record(row).value(id_column): row for row in range(model.rowCount())
+                             if row not in model.deleted_rows}
+        return self._id_rows
+
+    def apply(self) -> None:
+        """ Apply the coalesced changes to the model """
+        ids, self.changed_ids = self.changed_ids, set()
+        inserted, self.inserted_ids = self.inserted_ids, set()
+        deleted, self.deleted_ids = self.deleted_ids, set()
+        count = len(ids) + len(inserted) + len(deleted)
+        reload, self.reload = self.reload or count > self.reload_threshold, False
+
+        if not reload and deleted:
+            self.remove_rows(deleted)
+        if not reload and (ids or inserted):
+            reload = self.patch_rows(ids, inserted)
+        if reload:
+            self.reload_model()
+
+    def reload_model(self) -> None:
+        # re-selecting would discard unsubmitted edits - wait for them to be submitted or reverted
+        if self.model.isDirty():
+            self.held_reload = True
+            return
+
+        # release the result of a partially fetched select - SQLite would otherwise re-select from the same snapshot
+        self.model.query().finish()
+        self.model.select()
+
+    def remove_rows(self, ids: typing.Set[typing.Any]) -> None:
+        """ Exclude the loaded rows with the given primary keys from the model - rows which have not been fetched yet
+            are no longer read when they are fetched """
+
+        model = self.model
+        id_rows = self.id_rows()
+        rows = []
+        edited = []
+        for id_value in ids:
+            row = id_rows.get(id_value)
+            if row is None:
+                continue
+            if row in model.dirty_cells or row in model.removed_rows:
+                edited.append(id_value)
+            else:
+                rows.append(row)
+
+        if rows:
+            model.mark_deleted(rows)
+            self._id_rows = None
+        self.held_deleted_ids.update(edited)
+
+    def patch_rows(self, ids: typing.Set[typing.Any], inserted: typing.Set[typing.Any]=frozenset()) -> bool:
+        """ Re-read the rows with the given primary keys through the model's own query and patch them into the model,
+            returning whether the model must be re-selected instead - inserted rows are only re-selected if they match
+            the model's filter """
+
+        model = self.model
+        id_rows = self.id_rows()
+        if not model.canFetchMore():
+            candidates = ids | inserted
+        else:
+            # rows which have not been fetched yet will be read with their new values when they are fetched
+            candidates = {id_value for id_value in ids if id_value in id_rows} | inserted
+        if not candidates:
+            return False
+
+        # read on the feed's connection - it sees the changes the feed reported
+        database = self.feed.connection
+        id_field = model.id_field_name
+        query = QSqlQuery(database)
+        query.setForwardOnly(True)
+        query.prepare('SELECT * FROM ({0}) changed_rows WHERE {1} IN ({2})'.format(
+            model.selectStatement(), database.driver().escapeIdentifier(id_field, QSqlDriver.FieldName),
+            ', '.join('?' * len(candidates))))
+        for id_value in candidates:
+            query.addBindValue(id_value)
+        if not execute(query, connection=database):
+            logger.warning('unable to read changed rows: %s', query.lastError().text())
+            return True
+
+        id_column = query.record().indexOf(id_field)
+        field_names = [field.name for field in model.fields]
+        found = set()
+        edited = []
+        while query.next():
+            id_value = query.value(id_column)
+            found.add(id_value)
+            row = id_rows.get(id_value)
+            if row is None:
+                # the row is new or now matches the model's filter
+                return True
+            if row in model.dirty_cells or row in model.removed_rows:
+                edited.append(id_value)
+                continue
+
+            values = {name: query.value(column) for column, name in enumerate(field_names)}
+            model.patch_row(row, values)
+            model.dataChanged.emit(model.index(row, 0), model.index(row, model.columnCount() - 1))
+
+        self.held_changed_ids.update(edited)
+
+        # loaded rows which no longer match the model's filter
+        return any(id_value in id_rows for id_value in candidates - found)
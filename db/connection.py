@@ -0,0 +1,43 @@
+import threading
+
+from PyQt5.QtSql import QSqlDatabase
+
+from .exceptions import SQLError
+
+
+# name Qt gives the connection added without a name - QSqlDatabase.defaultConnection is not exposed by PyQt
+DEFAULT_CONNECTION = 'qt_sql_default_connection'
+
+
+def thread_connection_name(connection_name: str=None) -> str:
+    """ Name of the current thread's clone of the given connection """
+    return '{0}-thread-{1}'.format(connection_name or DEFAULT_CONNECTION, threading.get_ident())
+
+
+def thread_connection(connection_name: str=None) -> QSqlDatabase:
+    """ Return a connection for the current thread cloned from the named connection (default connection if not
+        supplied) - Qt connections may only be used by the thread which opened them
+        Params -
+            connection_name - name of the connection to clone, eg. model.database().connectionName()"""
+
+    name = thread_connection_name(connection_name)
+
+    if QSqlDatabase.contains(name):
+        connection = QSqlDatabase.database(name)
+    else:
+        connection = QSqlDatabase.cloneDatabase(connection_name or DEFAULT_CONNECTION, name)
+
+    if not connection.isOpen() and not connection.open():
+        raise SQLError(connection.lastError().text())
+    return connection
+
+
+def close_thread_connection(connection_name: str=None) -> None:
+    """ Close and remove the current thread's clone of the named connection - all queries using it must have been
+        destroyed """
+
+    name = thread_connection_name(connection_name)
+
+    if QSqlDatabase.contains(name):
+        QSqlDatabase.database(name, False).close()
+        QSqlDatabase.removeDatabase(name)
@@ -0,0 +1,182 @@
+import array
+import typing
+import operator
+
+from PyQt5.QtCore import Qt, QModelIndex
+from PyQt5.QtGui import QFont
+
+from ..assets import colour
+from .index import ColumnIndex
+
+if typing.TYPE_CHECKING:
+    from .model import DatabaseModel
+
+
+OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda value, values: value in values,
+}
+
+# data roles answered from formatting rules
+STYLE_ROLES = [Qt.ForegroundRole, Qt.BackgroundRole, Qt.FontRole]
+
+
+class Style(object):
+    """ Cell style - attributes which are None are left to the field
+        Params -
+            foreground - text colour, anything accepted by assets.colour()
+            background - cell colour, anything accepted by assets.colour()
+            bold - bold text
+            italic - italic text"""
+
+    def __init__(self, foreground: typing.Any=None, background: typing.Any=None, bold: bool=None,
+                 italic: bool=None) -> None:
+        self.foreground = foreground
+        self.background = background
+        self.bold = bold
+        self.italic = italic
+        self._roles = None
+
+    def merge(self, other: 'Style') -> 'Style':
+        """ Return a style with the attributes set by other overriding this style """
+        return Style(*[mine if theirs is None else theirs for mine, theirs in zip(self._values(), other._values())])
+
+    def _values(self) -> tuple:
+        return self.foreground, self.background, self.bold, self.italic
+
+    def role(self, role: int) -> typing.Any:
+        """ Return the value of the style for a data role, or None - values are built on first use and shared """
+        if self._roles is None:
+            font = None
+            if self.bold is not None or self.italic is not None:
+                font = QFont()
+                if self.bold is not None:
+                    font.setBold(self.bold)
+                if self.italic is not None:
+                    font.setItalic(self.italic)
+
+            self._roles = {
+                Qt.ForegroundRole: colour(self.foreground),
+                Qt.BackgroundRole: colour(self.background),
+                Qt.FontRole: font,
+            }
+        return self._roles.get(role)
+
+
+class FormatRule(object):
+    """ Conditional formatting rule, eg. FormatRule('balance', '<', 0, background='red')
+        Params -
+            field - field whose value is tested
+            op - comparison, one of <, <=, ==, !=, >, >=, in, or a callable taking (field value, value)
+            value - value to compare against
+            columns - names of the fields to style, the whole row if empty
+            style - Style keyword arguments - foreground, background, bold, italic"""
+
+    def __init__(self, field: str, op: typing.Union[str, typing.Callable[[typing.Any, typing.Any], bool]],
+                 value: typing.Any, columns: typing.List[str]=None, **style: typing.Any) -> None:
+        self.field = field
+        self.op = OPERATORS[op] if isinstance(op, str) else op
+        self.value = value
+        self.columns = columns or []
+        self.style = Style(**style)
+
+    def evaluate(self, values: typing.Sequence[typing.Any]) -> typing.List[bool]:
+        """ Test a column of values at once - null values and values which cannot be compared do not match """
+        op, target = self.op, self.value
+        try:
+            return [value is not None and bool(op(value, target)) for value in values]
+        except TypeError:
+            return [self._test(value) for value in values]
+
+    def _test(self, value: typing.Any) -> bool:
+        try:
+            return value is not None and bool(self.op(value, self.value))
+        except TypeError:
+            return False
+
+
+class RowStyleIndex(ColumnIndex):
+    """ Index holding the style of each row compiled from formatting rules - rules are evaluated over whole columns
+        when rows are loaded or changed, and each row stores only the id of its combination of matching rules so data()
+        looks up a shared style
+        Params -
+            model - database model to style
+            rules - formatting rules, later rules override earlier rules"""
+
+    def __init__(self, model: 'DatabaseModel', rules: typing.List[FormatRule]) -> None:
+        self.rules = list(rules)
+        self.rows = array.array('I')
+        fields = []
+        for rule in self.rules:
+            if rule.field not in fields:
+                fields.append(rule.field)
+
+        # combinations of matching rules, each with its styles keyed by column - combination 0 matches no rules
+        no_match = (False,) * len(self.rules)
+        self.combinations = {no_match: 0}  # type: typing.Dict[typing.Tuple[bool, ...], int]
+        self.column_styles = [{}]  # type: typing.List[typing.Dict[int, Style]]
+        self.changed_rows = set()  # type: typing.Set[int]
+
+        field_indexes = {field.name: field.index for field in model.fields}
+        self.rule_fields = [fields.index(rule.field) for rule in self.rules]
+        self.rule_columns = [[field_indexes[name] for name in rule.columns] or list(field_indexes.values())
+                             for rule in self.rules]
+
+        super().__init__(model, fields)
+
+    def _combination(self, matches: typing.Tuple[bool, ...]) -> int:
+        combination = self.combinations.get(matches)
+        if combination is None:
+            styles = {}
+            for rule, columns, matched in zip(self.rules, self.rule_columns, matches):
+                if not matched:
+                    continue
+                for column in columns:
+                    styles[column] = styles[column].merge(rule.style) if column in styles else rule.style
+
+            combination = self.combinations[matches] = len(self.column_styles)
+            self.column_styles.append(styles)
+        return combination
+
+    def _evaluate(self, values: typing.List[typing.List[typing.Any]]) -> typing.List[int]:
+        if not values:
+            return []
+
+        columns = list(zip(*values))
+        matches = [rule.evaluate(columns[field]) for rule, field in zip(self.rules, self.rule_fields)]
+        return [self._combination(row_matches) for row_matches in zip(*matches)]
+
+    def clear(self) -> None:
+        self.rows = array.array('I')
+
+    def insert_rows(self, first: int, values: typing.List[typing.List[typing.Any]]) -> None:
+        self.rows[first:first] = array.array('I', self._evaluate(values))
+
+    def remove_rows(self, first: int, last: int) -> None:
+        del self.rows[first:last + 1]
+
+    def update_row(self, row: int, values: typing.List[typing.Any]) -> None:
+        combination, = self._evaluate([values])
+        if combination != self.rows[row]:
+            self.rows[row] = combination
+            self.changed_rows.add(row)
+
+    # model data changed event handler - an edit can restyle every cell of its row, not just the edited cell
+    def _data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: typing.List[int]=None) -> None:
+        super()._data_changed(top_left, bottom_right, roles)
+
+        changed_rows, self.changed_rows = self.changed_rows, set()
+        last_column = self.model.columnCount() - 1
+        for row in sorted(changed_rows):
+            self.model.dataChanged.emit(self.model.index(row, 0), self.model.index(row, last_column), STYLE_ROLES)
+
+    def style(self, row: int, column: int) -> typing.Optional[Style]:
+        """ Return the style of a cell, or None if no rule applies """
+        if row >= len(self.rows):
+            return None
+        return self.column_styles[self.rows[row]].get(column)
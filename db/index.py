@@ -0,0 +1,405 @@
+import re
+import abc
+import bisect
+import typing
+import operator
+
+from PyQt5.QtCore import Qt, QObject, QModelIndex, pyqtSignal
+from PyQt5.QtSql import QSqlRecord
+
+from ..utils.abstract import QObjectABCMeta
+
+if typing.TYPE_CHECKING:
+    from .model import DatabaseModel
+
+
+class Bitmap(object):
+    """ Immutable set of row numbers stored as the bits of an integer - supports fast &, | and counting """
+
+    def __init__(self, bits: int=0) -> None:
+        self.bits = bits
+        self._bytes = None
+
+    @classmethod
+    def from_rows(cls, rows: typing.Iterable[int]) -> 'Bitmap':
+        """ Build a bitmap from row numbers """
+        data = bytearray()
+        for row in rows:
+            byte = row >> 3
+            if byte >= len(data):
+                data.extend(bytes(byte - len(data) + 1))
+            data[byte] |= 1 << (row & 7)
+        return cls(int.from_bytes(bytes(data), 'little'))
+
+    @classmethod
+    def all_rows(cls, count: int) -> 'Bitmap':
+        """ Bitmap with the first count rows set """
+        return cls((1 << count) - 1)
+
+    def __and__(self, other: 'Bitmap') -> 'Bitmap':
+        return Bitmap(self.bits & other.bits)
+
+    def __or__(self, other: 'Bitmap') -> 'Bitmap':
+        return Bitmap(self.bits | other.bits)
+
+    def __len__(self) -> int:
+        return bin(self.bits).count('1')
+
+    def __contains__(self, row: int) -> bool:
+        # test bits against a byte string - shifting a large integer per lookup is O(n)
+        if self._bytes is None:
+            self._bytes = self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little')
+        byte = row >> 3
+        return byte < len(self._bytes) and bool(self._bytes[byte] >> (row & 7) & 1)
+
+    def __iter__(self) -> typing.Iterator[int]:
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+
+class ColumnIndex(QObject, metaclass=QObjectABCMeta):
+    """ Index over one or more model columns which is built once after select() and kept up to date incrementally
+        from the model's change signals - subclasses implement the storage
+        Params -
+            model - database model to index
+            fields - names of the fields to index
+        Events -
+            index_changed - fired after the index has been rebuilt or updated"""
+
+    index_changed = pyqtSignal()
+
+    def __init__(self, model: 'DatabaseModel', fields: typing.List[str]) -> None:
+        super().__init__()
+
+        self.model = model
+        self.fields = list(fields)
+
+        field_indexes = {field.name: field.index for field in model.fields}
+        self.columns = [field_indexes[field] for field in self.fields]
+
+        # the model passes on its change signals before proxies see them, so filters built from the index are current
+        # when proxies refilter the changed rows
+        model.column_indexes.append(self)
+
+        self.rebuild()
+
+    def disconnect_model(self) -> None:
+        """ Stop following the model's changes """
+        if self in self.model.column_indexes:
+            self.model.column_indexes.remove(self)
+
+    def row_values(self, row: int) -> typing.List[typing.Any]:
+        """ Return the indexed values of the given row """
+        record = self.model.record(row)
+        return [record.value(column) for column in self.columns]
+
+    def rebuild(self) -> None:
+        """ Rebuild the index from every row of the model """
+        self.clear()
+        self.insert_rows(0, [self.row_values(row) for row in range(self.model.rowCount())])
+        self.index_changed.emit()
+
+    @abc.abstractmethod
+    def clear(self) -> None:
+        """ Remove all entries from the index """
+        pass
+
+    @abc.abstractmethod
+    def insert_rows(self, first: int, values: typing.List[typing.List[typing.Any]]) -> None:
+        """ Insert entries for rows starting at first, shifting following rows down """
+        pass
+
+    @abc.abstractmethod
+    def remove_rows(self, first: int, last: int) -> None:
+        """ Remove entries for rows first to last inclusive, shifting following rows up """
+        pass
+
+    @abc.abstractmethod
+    def update_row(self, row: int, values: typing.List[typing.Any]) -> None:
+        """ Replace the entry for the given row """
+        pass
+
+    # model reset event handler
+    def _model_reset(self) -> None:
+        self.rebuild()
+
+    # model data changed event handler
+    def _data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: typing.List[int]=None) -> None:
+        # changes which only restyle cells do not change values
+        if roles and Qt.DisplayRole not in roles and Qt.EditRole not in roles:
+            return
+        if not any(top_left.column() <= column <= bottom_right.column() for column in self.columns):
+            return
+
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            self.update_row(row, self.row_values(row))
+        self.index_changed.emit()
+
+    # model rows inserted event handler
+    def _rows_inserted(self, parent: QModelIndex, first: int, last: int) -> None:
+        self.insert_rows(first, [self.row_values(row) for row in range(first, last + 1)])
+        self.index_changed.emit()
+
+    # model rows removed event handler
+    def _rows_removed(self, parent: QModelIndex, first: int, last: int) -> None:
+        self.remove_rows(first, last)
+        self.index_changed.emit()
+
+
+class SearchIndex(ColumnIndex):
+    """ Index holding the case-folded text of each indexed field per row so that a search over every field is a
+        substring test or regex match per field without reading records - fields are matched separately so ^ and $
+        anchor to each field as they do in the single field filter"""
+
+    def __init__(self, model: 'DatabaseModel', fields: typing.List[str]) -> None:
+        self.rows = []  # type: typing.List[typing.Tuple[str, ...]]
+        super().__init__(model, fields)
+
+    def _search_texts(self, values: typing.List[typing.Any]) -> typing.Tuple[str, ...]:
+        return tuple('' if value is None else str(value).casefold() for value in values)
+
+    def clear(self) -> None:
+        self.rows = []
+
+    def insert_rows(self, first: int, values: typing.List[typing.List[typing.Any]]) -> None:
+        self.rows[first:first] = [self._search_texts(row_values) for row_values in values]
+
+    def remove_rows(self, first: int, last: int) -> None:
+        del self.rows[first:last + 1]
+
+    def update_row(self, row: int, values: typing.List[typing.Any]) -> None:
+        self.rows[row] = self._search_texts(values)
+
+    def search(self, pattern: str) -> typing.Set[int]:
+        """ Return the set of rows where any indexed field matches the pattern - deleted rows are excluded
+            Params -
+                pattern - regular expression or plain text to search for, matched case insensitively"""
+
+        # plain text can use a substring test rather than the regex engine
+        if re.escape(pattern) == pattern:
+            text = pattern.casefold()
+            rows = {row for row, texts in enumerate(self.rows) if any(text in field_text for field_text in texts)}
+            return rows - self.model.deleted_rows
+
+        search = self._regex(pattern).search
+        rows = {row for row, texts in enumerate(self.rows) if any(search(field_text) for field_text in texts)}
+        return rows - self.model.deleted_rows
+
+    def record_filter(self, pattern: str) -> typing.Callable[[QSqlRecord], bool]:
+        """ Return a callable testing a record as search() tests a row, for records which are not loaded in the model
+            Params -
+                pattern - regular expression or plain text to search for, matched case insensitively"""
+
+        if re.escape(pattern) == pattern:
+            text = pattern.casefold()
+            match = lambda field_text: text in field_text
+        else:
+            match = self._regex(pattern).search
+
+        fields = list(self.fields)
+        search_texts = self._search_texts
+
+        def accepts(record: QSqlRecord) -> bool:
+            return any(match(field_text) for field_text in search_texts([record.value(field) for field in fields]))
+        return accepts
+
+    @staticmethod
+    def _regex(pattern: str) -> typing.Pattern:
+        try:
+            return re.compile(pattern, flags=re.IGNORECASE)
+        except re.error:
+            return re.compile(re.escape(pattern), flags=re.IGNORECASE)
+
+
+class BitmapIndex(ColumnIndex):
+    """ Index holding a bitmap of rows for each distinct value of a single low cardinality field, eg. booleans """
+
+    def __init__(self, model: 'DatabaseModel', field: str) -> None:
+        self.values = []  # type: typing.List[typing.Any]
+        self.bitmaps = {}  # type: typing.Dict[typing.Any, int]
+        super().__init__(model, [field])
+
+    def clear(self) -> None:
+        self.values = []
+        self.bitmaps = {}
+
+    def insert_rows(self, first: int, values: typing.List[typing.List[typing.Any]]) -> None:
+        count = len(values)
+        low_mask = (1 << first) - 1
+        for value, bits in self.bitmaps.items():
+            self.bitmaps[value] = (bits & low_mask) | ((bits >> first) << (first + count))
+
+        new_rows = {}
+        for offset, (value,) in enumerate(values):
+            new_rows.setdefault(value, []).append(first + offset)
+        for value, rows in new_rows.items():
+            self.bitmaps[value] = self.bitmaps.get(value, 0) | Bitmap.from_rows(rows).bits
+
+        self.values[first:first] = [value for value, in values]
+
+    def remove_rows(self, first: int, last: int) -> None:
+        low_mask = (1 << first) - 1
+        for value, bits in self.bitmaps.items():
+            self.bitmaps[value] = (bits & low_mask) | ((bits >> (last + 1)) << first)
+        del self.values[first:last + 1]
+
+    def update_row(self, row: int, values: typing.List[typing.Any]) -> None:
+        value, = values
+        old_value = self.values[row]
+        if value == old_value:
+            return
+
+        self.bitmaps[old_value] &= ~(1 << row)
+        self.bitmaps[value] = self.bitmaps.get(value, 0) | (1 << row)
+        self.values[row] = value
+
+    def rows(self, value: typing.Any, op: typing.Callable[[typing.Any, typing.Any], bool]=operator.eq) -> Bitmap:
+        """ Return the bitmap of rows where op(row value, value) is true - op is evaluated once per distinct value and
+            deleted rows are excluded
+            Params -
+                value - value to compare against
+                op - comparison operation"""
+
+        bits = 0
+        for row_value, row_bits in self.bitmaps.items():
+            if op(row_value, value):
+                bits |= row_bits
+        return Bitmap(bits & ~self._deleted_bits())
+
+    def record_filter(self, value: typing.Any, op: typing.Callable[[typing.Any, typing.Any], bool]=operator.eq
+                      ) -> typing.Callable[[QSqlRecord], bool]:
+        """ Return a callable testing a record as rows() tests a row, for records which are not loaded in the model
+            Params -
+                value - value to compare against
+                op - comparison operation"""
+
+        field = self.fields[0]
+        return lambda record: bool(op(record.value(field), value))
+
+    def all_rows(self) -> Bitmap:
+        """ Return the bitmap of every indexed row which has not been deleted """
+        return Bitmap(Bitmap.all_rows(len(self.values)).bits & ~self._deleted_bits())
+
+    def _deleted_bits(self) -> int:
+        return Bitmap.from_rows(self.model.deleted_rows).bits
+
+
+class SortedIndex(ColumnIndex):
+    """ Index holding the rows of a single field ordered by value so that range queries are answered by bisection in
+        O(log n + k) - null values are not indexed
+        Params -
+            key - callable converting field values into comparable keys, returning None excludes the value"""
+
+    def __init__(self, model: 'DatabaseModel', field: str, key: typing.Callable[[typing.Any], typing.Any]=None) -> None:
+        self.key = key
+        self.keys = []  # type: typing.List[typing.Any]
+        self.rows = []  # type: typing.List[int]
+        self.values = []  # type: typing.List[typing.Any]
+        super().__init__(model, [field])
+
+    def _key(self, value: typing.Any) -> typing.Any:
+        if value is None or self.key is None:
+            return value
+        return self.key(value)
+
+    def _insert(self, key: typing.Any, row: int) -> None:
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.rows.insert(position, row)
+
+    def clear(self) -> None:
+        self.keys = []
+        self.rows = []
+        self.values = []
+
+    def insert_rows(self, first: int, values: typing.List[typing.List[typing.Any]]) -> None:
+        count = len(values)
+        keys = [self._key(value) for value, in values]
+
+        if first < len(self.values):
+            self.rows = [row + count if row >= first else row for row in self.rows]
+        self.values[first:first] = keys
+
+        new_entries = [(key, first + offset) for offset, key in enumerate(keys) if key is not None]
+
+        # sort in bulk when building, otherwise insert each entry in place
+        if len(new_entries) > len(self.keys):
+            entries = sorted(list(zip(self.keys, self.rows)) + new_entries, key=operator.itemgetter(0))
+            self.keys = [key for key, row in entries]
+            self.rows = [row for key, row in entries]
+        else:
+            for key, row in new_entries:
+                self._insert(key, row)
+
+    def remove_rows(self, first: int, last: int) -> None:
+        count = last - first + 1
+        entries = [(key, row if row < first else row - count)
+                   for key, row in zip(self.keys, self.rows) if not first <= row <= last]
+        self.keys = [key for key, row in entries]
+        self.rows = [row for key, row in entries]
+        del self.values[first:last + 1]
+
+    def update_row(self, row: int, values: typing.List[typing.Any]) -> None:
+        key = self._key(values[0])
+        old_key = self.values[row]
+        if key == old_key:
+            return
+
+        if old_key is not None:
+            start = bisect.bisect_left(self.keys, old_key)
+            end = bisect.bisect_right(self.keys, old_key)
+            position = self.rows.index(row, start, end)
+            del self.keys[position]
+            del self.rows[position]
+
+        if key is not None:
+            self._insert(key, row)
+        self.values[row] = key
+
+    def between(self, low: typing.Any=None, high: typing.Any=None, include_low: bool=True,
+                include_high: bool=True) -> typing.Set[int]:
+        """ Return the set of rows with values in the given range - deleted rows are excluded
+            Params -
+                low - lower bound, None for no lower bound
+                high - upper bound, None for no upper bound
+                include_low - whether rows equal to the lower bound are included
+                include_high - whether rows equal to the upper bound are included"""
+
+        start = 0
+        if low is not None:
+            search = bisect.bisect_left if include_low else bisect.bisect_right
+            start = search(self.keys, self._key(low))
+
+        end = len(self.keys)
+        if high is not None:
+            search = bisect.bisect_right if include_high else bisect.bisect_left
+            end = search(self.keys, self._key(high))
+
+        return set(self.rows[start:end]) - self.model.deleted_rows
+
+    def record_filter(self, low: typing.Any=None, high: typing.Any=None, include_low: bool=True,
+                      include_high: bool=True) -> typing.Callable[[QSqlRecord], bool]:
+        """ Return a callable testing a record as between() tests a row, for records which are not loaded in the model
+            Params -
+                low - lower bound, None for no lower bound
+                high - upper bound, None for no upper bound
+                include_low - whether records equal to the lower bound are included
+                include_high - whether records equal to the upper bound are included"""
+
+        field = self.fields[0]
+        low_key = None if low is None else self._key(low)
+        high_key = None if high is None else self._key(high)
+
+        def accepts(record: QSqlRecord) -> bool:
+            key = self._key(record.value(field))
+            if key is None:
+                return False
+            if low_key is not None and (key < low_key or (key == low_key and not include_low)):
+                return False
+            if high_key is not None and (key > high_key or (key == high_key and not include_high)):
+                return False
+            return True
+        return accepts
@@ -0,0 +1,203 @@
+import re
+import sys
+import time
+import typing
+import logging
+import threading
+import collections
+
+from PyQt5.QtSql import QSqlQuery, QSqlDatabase
+
+from ..utils.logging import LatencyStats
+
+
+logger = logging.getLogger('sql')
+
+# instrumentation options - queries are executed directly, untimed, unless enabled
+_settings = {'enabled': False, 'slow_threshold': 0.5, 'explain': False}
+
+# recent queries as dicts of sql, parameters, duration, rows and view, and recent queries over the slow threshold
+recent_queries = collections.deque(maxlen=500)
+slow_queries = collections.deque(maxlen=100)
+
+# aggregate stats keyed by normalized query shape
+_query_stats = {}  # type: typing.Dict[str, dict]
+_lock = threading.Lock()
+
+_string_literal = re.compile(r"'(?:[^']|'')*'")
+_number_literal = re.compile(r'\b\d+(?:\.\d+)?\b')
+_placeholder_list = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_named_placeholder = re.compile(r'(?<!:):\w+')
+_whitespace = re.compile(r'\s+')
+_select_statement = re.compile(r'\s*(SELECT|WITH)\b', re.IGNORECASE)
+
+
+def enable_instrumentation(slow_threshold: float=None, explain: bool=False) -> None:
+    """ Time every instrumented query
+        Params -
+            slow_threshold - seconds above which a query is logged as slow
+            explain - capture the query plan of slow SELECT queries"""
+
+    _settings['enabled'] = True
+    _settings['explain'] = explain
+    if slow_threshold is not None:
+        _settings['slow_threshold'] = slow_threshold
+
+
+def disable_instrumentation() -> None:
+    """ Stop timing queries - recorded stats are kept until reset_query_stats() """
+    _settings['enabled'] = False
+
+
+def instrumentation_enabled() -> bool:
+    return _settings['enabled']
+
+
+def normalize_sql(sql: str) -> str:
+    """ Return the shape of a query with literals and placeholders replaced by ? so that queries differing only in
+        their values are aggregated together """
+
+    shape = _string_literal.sub('?', sql)
+    shape = _named_placeholder.sub('?', shape)
+    shape = _number_literal.sub('?', shape)
+    shape = _placeholder_list.sub('(...)', shape)
+    return _whitespace.sub(' ', shape).strip()
+
+
+def calling_view() -> typing.Optional[str]:
+    """ Return the class name of the nearest widget on the call stack - the view which caused the query """
+    # imported here so the db package does not require QtWidgets
+    from PyQt5.QtWidgets import QWidget
+
+    frame = sys._getframe(1)
+    while frame is not None:
+        caller = frame.f_locals.get('self')
+        if isinstance(caller, QWidget):
+            return caller.__class__.__name__
+        frame = frame.f_back
+    return None
+
+
+def explain(connection: QSqlDatabase, sql: str, parameters: typing.List[typing.Any]) -> typing.List[str]:
+    """ Return the query plan of a SELECT statement, one line per row of EXPLAIN output """
+    if not _select_statement.match(sql):
+        return []
+
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.driverName() == 'QSQLITE' else 'EXPLAIN '
+    query = QSqlQuery(connection)
+    if not query.prepare(prefix + sql):
+        return []
+    for index, value in enumerate(parameters):
+        query.bindValue(index, value)
+    if not query.exec_():
+        return []
+
+    plan = []
+    columns = query.record().count()
+    while query.next():
+        plan.append(' '.join(str(query.value(column)) for column in range(columns)))
+    return plan
+
+
+def record_query(sql: str, parameters: typing.List[typing.Any], duration: float, rows: typing.Optional[int],
+                 connection: QSqlDatabase=None, view: str=None) -> None:
+    """ Record an executed query - queries over the slow threshold are logged, with their plan if enabled
+        Params -
+            sql - query text
+            parameters - bound values
+            duration - seconds taken to execute
+            rows - rows returned or affected, None if unknown
+            connection - connection the query ran on, required to capture the plan
+            view - name of the view which caused the query, found from the call stack if not supplied"""
+
+    entry = {
+        'sql': sql,
+        'parameters': parameters,
+        'duration': duration,
+        'rows': rows,
+        'view': view or calling_view(),
+        'time': time.time(),
+    }
+    shape = normalize_sql(sql)
+
+    with _lock:
+        recent_queries.append(entry)
+
+        stats = _query_stats.get(shape)
+        if stats is None:
+            stats = _query_stats[shape] = {'latency': LatencyStats(), 'rows': 0, 'views': collections.Counter()}
+        stats['latency'].add(int(duration * 1e9))
+        # the total is unknown once any query of the shape has an unknown row count
+        if rows is None or stats['rows'] is None:
+            stats['rows'] = None
+        else:
+            stats['rows'] += rows
+        stats['views'][entry['view']] += 1
+
+    if duration >= _settings['slow_threshold']:
+        if _settings['explain'] and connection is not None:
+            entry['plan'] = explain(connection, sql, parameters)
+        slow_queries.append(entry)
+        logger.warning('slow query %.3fs (%s rows) from %s: %s %r%s', duration, '?' if rows is None else rows,
+                       entry['view'], sql, parameters,
+                       ''.join('\n    ' + line for line in entry.get('plan', [])))
+
+
+def execute(query: QSqlQuery, sql: str=None, batch: bool=False, connection: QSqlDatabase=None) -> bool:
+    """ Execute a query, timing it if instrumentation is enabled
+        Params -
+            query - query to execute, already prepared and bound unless sql is given
+            sql - statement to execute directly
+            batch - execute the prepared query with execBatch
+            connection - connection the query runs on, used to capture plans of slow queries"""
+
+    if not _settings['enabled']:
+        if sql is not None:
+            return query.exec_(sql)
+        return query.execBatch() if batch else query.exec_()
+
+    parameters = [query.boundValue(index) for index in range(len(query.boundValues()))] if sql is None else []
+    start = time.perf_counter()
+    if sql is not None:
+        executed = query.exec_(sql)
+    else:
+        executed = query.execBatch() if batch else query.exec_()
+    duration = time.perf_counter() - start
+
+    # drivers which cannot report the size of a result or the rows affected, such as QSQLITE for selects, return -1
+    rows = query.size() if query.isSelect() else query.numRowsAffected()
+    record_query(sql or query.lastQuery(), parameters, duration, rows if rows >= 0 else None,
+                 connection=None if batch else connection)
+    return executed
+
+
+def query_stats() -> typing.List[dict]:
+    """ Return aggregate stats of each query shape, most total time first - count, total, mean, p95 and max are in
+        seconds, rows is None if the driver could not count the rows of any of the queries and views counts the
+        queries caused by each view """
+
+    with _lock:
+        items = [(shape, stats['latency'], stats['rows'], dict(stats['views']))
+                 for shape, stats in _query_stats.items()]
+
+    results = []
+    for shape, latency, rows, views in items:
+        results.append({
+            'sql': shape,
+            'count': latency.count,
+            'total': latency.total / 1e9,
+            'mean': latency.total / latency.count / 1e9,
+            'p95': latency.percentile(0.95) / 1e9,
+            'max': latency.max / 1e9,
+            'rows': rows,
+            'views': views,
+        })
+    return sorted(results, key=lambda result: result['total'], reverse=True)
+
+
+def reset_query_stats() -> None:
+    """ Discard recorded queries and stats """
+    with _lock:
+        _query_stats.clear()
+        recent_queries.clear()
+        slow_queries.clear()
@@ -0,0 +1,157 @@
+import typing
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+from PyQt5.QtSql import QSql, QSqlQuery, QSqlResult, QSqlRecord, QSqlDriver
+
+from .connection import thread_connection, close_thread_connection
+from .exceptions import SQLError
+from .instrumentation import execute
+
+
+class PrefetchedResult(QSqlResult):
+    """ Query result over rows which have already been read, so rows read on a worker thread can be handed to a model
+        through a QSqlQuery - not instantiated by user
+        Params -
+            driver - driver of the connection the model uses
+            record - record structure of the rows
+            rows - values of each row in record order"""
+
+    def __init__(self, driver: QSqlDriver, record: QSqlRecord, rows: typing.List[typing.List[typing.Any]]) -> None:
+        super().__init__(driver)
+
+        self._record = QSqlRecord(record)
+        self.rows = rows
+        self.setSelect(True)
+        self.setActive(True)
+        self.setAt(QSql.BeforeFirstRow)
+
+    # Qt virtual override
+    def data(self, column: int) -> typing.Any:
+        return self.rows[self.at()][column]
+
+    # Qt virtual override
+    def isNull(self, column: int) -> bool:
+        return self.rows[self.at()][column] is None
+
+    # Qt virtual override - the rows cannot be re-executed
+    def reset(self, statement: str) -> bool:
+        return False
+
+    # Qt virtual override
+    def fetch(self, row: int) -> bool:
+        if not 0 <= row < len(self.rows):
+            return False
+        self.setAt(row)
+        return True
+
+    # Qt virtual override
+    def fetchFirst(self) -> bool:
+        return self.fetch(0)
+
+    # Qt virtual override
+    def fetchLast(self) -> bool:
+        return self.fetch(len(self.rows) - 1)
+
+    # Qt virtual override
+    def size(self) -> int:
+        return len(self.rows)
+
+    # Qt virtual override
+    def numRowsAffected(self) -> int:
+        return -1
+
+    # Qt virtual override
+    def record(self) -> QSqlRecord:
+        return QSqlRecord(self._record)
+
+
+class RowsLoader(QObject):
+    """ Reads every row of a select statement on a pooled worker thread - each worker thread keeps its own clone of the
+        connection between loads. Loads which are cancelled before they start are dropped from the pool's queue, and
+        loads cancelled while reading stop fetching rows
+        Params -
+            connection_name - name of the connection to clone for the worker
+            statement - select statement to read
+        Events -
+            loaded - fired with the record structure and the values of each row once they have been read
+            failed - fired with an error message if the rows could not be read
+            finished - fired once the load has completed, failed or been cancelled"""
+
+    loaded = pyqtSignal(object, list)
+    failed = pyqtSignal(str)
+    finished = pyqtSignal()
+
+    # maximum number of worker threads, and so worker connections per database, shared by all loaders
+    pool_size = 4
+
+    _pool = None  # type: QThreadPool
+
+    def __init__(self, connection_name: str, statement: str) -> None:
+        super().__init__()
+
+        self.connection_name = connection_name
+        self.statement = statement
+        self.cancelled = False
+        self._runnable = _LoaderRunnable(self)
+
+    @classmethod
+    def pool(cls) -> QThreadPool:
+        """ Return the thread pool loads run on - its threads do not expire so their connections can be reused """
+        if RowsLoader._pool is None:
+            RowsLoader._pool = QThreadPool()
+            RowsLoader._pool.setMaxThreadCount(cls.pool_size)
+            RowsLoader._pool.setExpiryTimeout(-1)
+        return RowsLoader._pool
+
+    def start(self) -> None:
+        """ Queue the load on the thread pool """
+        self.pool().start(self._runnable)
+
+    def cancel(self) -> None:
+        """ Drop the load if it has not started, otherwise stop fetching rows - neither loaded nor failed fire """
+        self.cancelled = True
+        if self.pool().tryTake(self._runnable):
+            self.finished.emit()
+
+    def run(self) -> None:
+        """ Read the rows on the calling worker thread """
+        try:
+            record, rows = self._read()
+        except SQLError as error:
+            # the connection may have been lost - a fresh clone is opened by the next load on this thread
+            close_thread_connection(self.connection_name)
+            if not self.cancelled:
+                self.failed.emit(str(error))
+        else:
+            if not self.cancelled:
+                self.loaded.emit(record, rows)
+        finally:
+            self.finished.emit()
+
+    def _read(self) -> typing.Tuple[QSqlRecord, typing.List[typing.List[typing.Any]]]:
+        connection = thread_connection(self.connection_name)
+        query = QSqlQuery(connection)
+        query.setForwardOnly(True)
+        if not execute(query, self.statement, connection=connection):
+            raise SQLError(query.lastError().text())
+
+        record = query.record()
+        columns = range(record.count())
+        rows = []
+        while not self.cancelled and query.next():
+            rows.append([None if query.isNull(column) else query.value(column) for column in columns])
+        query.finish()
+        return record, rows
+
+
+class _LoaderRunnable(QRunnable):
+    """ Runs a loader on the thread pool - the loader keeps the runnable so it can be taken back off the queue """
+
+    def __init__(self, loader: RowsLoader) -> None:
+        super().__init__()
+        self.setAutoDelete(False)
+        self.loader = loader
+
+    # QT override
+    def run(self) -> None:
+        self.loader.run()
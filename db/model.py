@@ -1,11 +1,22 @@
+import time
 import typing
+import itertools
 
 
-from PyQt5.QtCore import Qt, QModelIndex, QObject
+from PyQt5.QtCore import Qt, QModelIndex, QObject, QSize, pyqtSignal
 from PyQt5.QtGui import QColor, QIcon
-from PyQt5.QtSql import QSqlRecord, QSqlQuery, QSqlRelationalTableModel, QSqlRelation
+from PyQt5.QtSql import QSqlRecord, QSqlQuery, QSqlRelationalTableModel, QSqlRelation, QSqlDriver, QSqlError
+from PyQt5 import sip
 
+from ..assets import icon, pixmap, colour
 from ..exceptions import ImproperlyConfigured
+from .exceptions import SQLError
+from .instrumentation import execute, record_query, instrumentation_enabled
+from .index import ColumnIndex
+from .formatting import FormatRule, RowStyleIndex, STYLE_ROLES
+from .changefeed import ChangeFeed, ChangeSubscription
+from .writer import WriteBehindQueue, execute_updates, execute_deletes
+from .loader import PrefetchedResult
 
 
 class DatabaseField(QObject):
@@ -27,11 +38,13 @@ class DatabaseField(QObject):
         return value
 
     def text_colour(self, value, record: QSqlRecord) -> QColor:
-        """ Return the text colour to be displayed for the given record"""
+        """ Return the text colour to be displayed for the given record - may also be a colour name or (r, g, b[, a])
+            tuple, which is mapped to a shared QColor"""
         return None
 
     def background_colour(self, value, record: QSqlRecord) -> QColor:
-        """ Return the cell colour to be displayed for the given record"""
+        """ Return the cell colour to be displayed for the given record - may also be a colour name or (r, g, b[, a])
+            tuple, which is mapped to a shared QColor"""
         return None
 
     def decoration(self, value, record: QSqlRecord) -> QIcon:
@@ -42,15 +55,34 @@ class DatabaseField(QObject):
         """ Return the flags that determine interaction capabilities"""
         return Qt.ItemIsSelectable | Qt.ItemIsEnabled | Qt.ItemIsEditable
 
+    def set_icon_size(self, size: QSize) -> None:
+        """ Called by views with their icon size so icons can be pre-rendered at the size they are drawn"""
+        pass
+
 
 class BooleanDatabaseField(DatabaseField):
-    """ Database field that shows boolean fields as an icon representing true/false"""
+    """ Database field that shows boolean fields as an icon representing true/false - icons are shared by every field,
+        and pre-rendered as pixmaps at the given icon size, or the icon size of the view showing the field"""
 
-    def __init__(self, parent: DatabaseField, true_icon: str=':record/tick', false_icon: str=':record/cross') -> None:
+    def __init__(self, parent: DatabaseField, true_icon: str=':record/tick', false_icon: str=':record/cross',
+                 icon_size: QSize=None) -> None:
         super().__init__(parent.name, parent.index)
 
-        self.tick = QIcon(true_icon)
-        self.cross = QIcon(false_icon)
+        self.true_icon = true_icon
+        self.false_icon = false_icon
+        self.fixed_icon_size = icon_size is not None
+
+        if icon_size is None:
+            self.tick = icon(true_icon)
+            self.cross = icon(false_icon)
+        else:
+            self.tick = pixmap(true_icon, icon_size)
+            self.cross = pixmap(false_icon, icon_size)
+
+    def set_icon_size(self, size: QSize) -> None:
+        if not self.fixed_icon_size:
+            self.tick = pixmap(self.true_icon, size)
+            self.cross = pixmap(self.false_icon, size)
 
     def display(self, value, record: QSqlRecord) -> str:
         # display no text
@@ -69,6 +101,10 @@ class DatabaseModel(QSqlRelationalTableModel):
                 id_sequence_name - db sequence used to generate autonumber ids
                 vertical_header - show vertical header
                 vertical_header_field - optionally set field to show in vertical header
+                delete_chunk_size - maximum number of ids per DELETE statement when deleting in bulk
+            Events -
+                rows_deleted - fired with the primary keys of the records deleted by delete_rows()
+                edits_resolved - fired when unsubmitted edits have been submitted or reverted
          """
 
     table = ''
@@ -78,6 +114,11 @@ class DatabaseModel(QSqlRelationalTableModel):
     id_sequence_name = ''  # type: str
     vertical_header = False
     vertical_header_field = None
+    delete_chunk_size = 500
+    format_rules = []  # type: typing.List[FormatRule]
+
+    rows_deleted = pyqtSignal(list)
+    edits_resolved = pyqtSignal()
 
     def __init__(self) -> None:
         super().__init__()
@@ -93,6 +134,26 @@ class DatabaseModel(QSqlRelationalTableModel):
 
         self.fields = [] # type: List[DatabaseField]
 
+        # values committed outside of Qt's edit cache, keyed by row then column - cleared on select
+        self.patches = {}  # type: typing.Dict[int, typing.Dict[int, typing.Any]]
+        self._save_queue = None
+
+        # columns edited through setData, keyed by row, and rows removed - checked against Qt's cache before submitting
+        self.dirty_cells = {}  # type: typing.Dict[int, typing.Set[int]]
+        self.removed_rows = set()  # type: typing.Set[int]
+
+        # rows deleted from the database by delete_rows() or mark_deleted() which are still loaded - cleared on select.
+        # rowCount() and record() still include them, so code reading the model rather than a filter proxy skips them
+        self.deleted_rows = set()  # type: typing.Set[int]
+        self.rowsInserted.connect(self._rows_inserted)
+        self.rowsRemoved.connect(self._rows_removed)
+
+        # indexes over the model's columns - these handlers are connected before any proxy or view connects, so the
+        # indexes are up to date when proxies refilter changed rows
+        self.column_indexes = []  # type: typing.List[ColumnIndex]
+        self.modelReset.connect(self._reset_indexes)
+        self.dataChanged.connect(self._update_indexes)
+
         # auto-generate fields for the database table
         for column_idx in range(self.columnCount()):
             field_name = record.fieldName(column_idx)
@@ -100,6 +161,46 @@ class DatabaseModel(QSqlRelationalTableModel):
             self.fields.append(field)
             setattr(self, field_name, field)
 
+        self.row_styles = None  # type: RowStyleIndex
+        if self.format_rules:
+            self.set_format_rules(self.format_rules)
+
+        self.change_subscription = None  # type: ChangeSubscription
+        self._prefetched_result = None  # type: PrefetchedResult
+
+    def set_format_rules(self, rules: typing.List[FormatRule]) -> None:
+        """ Style rows from declarative rules rather than per cell text_colour() and background_colour() calls - the
+            rules are evaluated once per row as rows are loaded or changed and take precedence over the fields
+            Params -
+                rules - formatting rules, later rules override earlier rules"""
+
+        if self.row_styles is not None:
+            self.row_styles.disconnect_model()
+            self.row_styles = None
+        if rules:
+            self.row_styles = RowStyleIndex(self, rules)
+        if self.rowCount():
+            self.dataChanged.emit(self.index(0, 0), self.index(self.rowCount() - 1, self.columnCount() - 1),
+                                  STYLE_ROLES)
+
+    def follow_changes(self, feed: ChangeFeed, delay: int=100, reload_threshold: int=500) -> ChangeSubscription:
+        """ Keep the model up to date with changes made by other clients - changed rows are patched in place by
+            primary key rather than re-selecting the whole table
+            Params -
+                feed - change feed reporting changes to the model's table
+                delay - milliseconds to coalesce bursts of changes over
+                reload_threshold - number of changed rows above which the model is re-selected instead"""
+
+        self.stop_following_changes()
+        self.change_subscription = ChangeSubscription(self, feed, delay, reload_threshold)
+        return self.change_subscription
+
+    def stop_following_changes(self) -> None:
+        """ Stop applying changes from the change feed """
+        if self.change_subscription is not None:
+            self.change_subscription.cancel()
+            self.change_subscription = None
+
     # Qt virtual override - returns header data for given cell
     def headerData(self, index: int, orientation: int, role: int=None) -> str:
         if orientation == Qt.Horizontal:
@@ -125,7 +226,18 @@ class DatabaseModel(QSqlRelationalTableModel):
         if not model_index.isValid():
             return None
 
+        if self.row_styles is not None and role in STYLE_ROLES:
+            style = self.row_styles.style(model_index.row(), model_index.column())
+            if style is not None:
+                value = style.role(role)
+                if value is not None:
+                    return value
+
         if role not in [Qt.DisplayRole, Qt.ForegroundRole, Qt.BackgroundRole, Qt.DecorationRole]:
+            if role == Qt.EditRole and model_index.row() in self.patches:
+                patch = self.patches[model_index.row()]
+                if model_index.column() in patch:
+                    return patch[model_index.column()]
             return super().data(model_index, role)
 
         row = model_index.row()
@@ -138,10 +250,10 @@ class DatabaseModel(QSqlRelationalTableModel):
             return field.display(field_value, record)
 
         elif role == Qt.ForegroundRole:
-            return field.text_colour(field_value, record)
+            return colour(field.text_colour(field_value, record))
 
         elif role == Qt.BackgroundRole:
-            return field.background_colour(field_value, record)
+            return colour(field.background_colour(field_value, record))
 
         elif role == Qt.DecorationRole:
             return field.decoration(field_value, record)
@@ -163,10 +275,259 @@ class DatabaseModel(QSqlRelationalTableModel):
 
     flags.trace = False
 
+    # Qt override
+    def select(self) -> bool:
+        self._clear_tracked_rows()
+
+        if not instrumentation_enabled():
+            selected = super().select()
+        else:
+            start = time.perf_counter()
+            selected = super().select()
+            record_query(self.selectStatement(), [], time.perf_counter() - start, self.rowCount(),
+                         connection=self.database())
+
+        # the query holding any loaded rows has been replaced, which deletes their result
+        self._prefetched_result = None
+        return selected
+
+    def load_rows(self, record: QSqlRecord, rows: typing.List[typing.List[typing.Any]]) -> None:
+        """ Populate the model with rows of its select statement which have been read elsewhere, eg. by a RowsLoader on
+            a worker thread, rather than with select() - the rows can be edited and submitted as selected rows are
+            Params -
+                record - record structure of the select statement
+                rows - values of each row in record order"""
+
+        if self.isDirty():
+            self.revertAll()
+        self._clear_tracked_rows()
+
+        result = PrefetchedResult(self.database().driver(), record, rows)
+        query = QSqlQuery(result)
+        # the query deletes the result once it is replaced, the python object must live as long to handle its calls
+        sip.transferto(result, None)
+        self.setQuery(query)
+        self._prefetched_result = result
+
+    def _clear_tracked_rows(self) -> None:
+        self.patches = {}
+        self.dirty_cells = {}
+        self.removed_rows = set()
+        self.deleted_rows = set()
+
+    # Qt override - tracks edited cells so only changed fields are submitted
+    def setData(self, model_index: QModelIndex, value: typing.Any, role: int=Qt.EditRole) -> bool:
+        # the cell is tracked first as Qt submits it from within setData with the OnFieldChange strategy
+        if role == Qt.EditRole and model_index.isValid():
+            self.dirty_cells.setdefault(model_index.row(), set()).add(model_index.column())
+
+        changed = super().setData(model_index, value, role)
+        if not changed and role == Qt.EditRole and model_index.isValid() and not self.isDirty(model_index):
+            self.dirty_cells.get(model_index.row(), set()).discard(model_index.column())
+        return changed
+
+    # Qt override - tracks removed rows so pending deletes can be found without scanning the model
+    def removeRows(self, row: int, count: int, parent: QModelIndex=QModelIndex()) -> bool:
+        # rows are snapshot first as Qt reverts pending inserts in the range, shifting the rows above them down
+        inserted = [candidate for candidate in range(row, row + count) if self.row_operation(candidate) == 'insert']
+        existing = [candidate - sum(1 for inserted_row in inserted if inserted_row < candidate)
+                    for candidate in range(row, row + count) if candidate not in inserted]
+
+        removed = super().removeRows(row, count, parent)
+        if removed:
+            self.removed_rows.update(removed_row for removed_row in existing
+                                     if self.row_operation(removed_row) == 'delete')
+        return removed
+
+    # Qt override
+    def revertRow(self, row: int) -> None:
+        edited = row in self.dirty_cells or row in self.removed_rows
+        self.dirty_cells.pop(row, None)
+        self.removed_rows.discard(row)
+        super().revertRow(row)
+        if edited:
+            self.edits_resolved.emit()
+
+    # Qt override
+    def revertAll(self) -> None:
+        edited = bool(self.dirty_cells or self.removed_rows)
+        self.dirty_cells = {}
+        self.removed_rows = set()
+        super().revertAll()
+        if edited:
+            self.edits_resolved.emit()
+
+    def _shift_rows(self, first: int, offset: int) -> None:
+        """ Move tracked rows from first onwards by offset after rows are inserted or removed """
+        self.dirty_cells = {row + offset if row >= first else row: columns for row, columns in self.dirty_cells.items()}
+        self.patches = {row + offset if row >= first else row: patch for row, patch in self.patches.items()}
+        self.removed_rows = {row + offset if row >= first else row for row in self.removed_rows}
+        self.deleted_rows = {row + offset if row >= first else row for row in self.deleted_rows}
+
+    # model rows inserted event handler
+    def _rows_inserted(self, parent: QModelIndex, first: int, last: int) -> None:
+        self._shift_rows(first, last - first + 1)
+        for index in list(self.column_indexes):
+            index._rows_inserted(parent, first, last)
+
+    # model rows removed event handler - only unsubmitted inserts are actually removed from the model
+    def _rows_removed(self, parent: QModelIndex, first: int, last: int) -> None:
+        for row in range(first, last + 1):
+            self.dirty_cells.pop(row, None)
+            self.patches.pop(row, None)
+            self.removed_rows.discard(row)
+            self.deleted_rows.discard(row)
+        self._shift_rows(last + 1, first - last - 1)
+        for index in list(self.column_indexes):
+            index._rows_removed(parent, first, last)
+
+    # model reset event handler
+    def _reset_indexes(self) -> None:
+        for index in list(self.column_indexes):
+            index._model_reset()
+
+    # model data changed event handler
+    def _update_indexes(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: typing.List[int]=None) -> None:
+        for index in list(self.column_indexes):
+            index._data_changed(top_left, bottom_right, roles)
+
+    # Qt virtual override - Qt's submit(), called from setData with OnFieldChange and by views and widget mappers on row
+    # change with OnRowChange, calls its own submitAll() which is not virtual and would bypass the override below
+    def submit(self) -> bool:
+        if self.editStrategy() in (self.OnFieldChange, self.OnRowChange):
+            return self.submitAll()
+        return True
+
+    # Qt override - edited rows are written with one UPDATE of only the changed fields per row, batched in a single
+    # transaction, and patched into the model rather than re-selected. Inserts and deletes are left to Qt
+    def submitAll(self) -> bool:
+        submitted = self._submit_all()
+        if submitted:
+            self.edits_resolved.emit()
+        return submitted
+
+    def _submit_all(self) -> bool:
+        updates = self.pending_updates()
+        if not updates:
+            return super().submitAll()
+
+        database = self.database()
+        if not database.transaction():
+            return super().submitAll()
+
+        try:
+            execute_updates(database, self.tableName(), self.id_field_name,
+                            [(id_value, values) for row, id_value, values in updates])
+        except SQLError as error:
+            database.rollback()
+            self.setLastError(QSqlError(str(error), '', QSqlError.StatementError))
+            return False
+
+        # committed rows no longer need Qt's cache
+        for row, id_value, values in updates:
+            self.patch_row(row, values)
+
+        if (self.isDirty() and not super().submitAll()) or not database.commit():
+            error = self.lastError() if self.lastError().isValid() else database.lastError()
+            database.rollback()
+            self._restore_updates(updates)
+            self.setLastError(error)
+            return False
+
+        return True
+
+    def _restore_updates(self, updates: typing.List[typing.Tuple[int, typing.Any, typing.Dict[str, typing.Any]]]) \
+            -> None:
+        """ Return patched values to Qt's cache as unsubmitted edits after a failed submit """
+        for row, id_value, values in updates:
+            patch = self.patches.get(row, {})
+            for field, value in values.items():
+                column = getattr(self, field).index
+                patch.pop(column, None)
+                self.setData(self.index(row, column), value)
+
+    # Qt override - the re-read values replace any patched into the row
+    def selectRow(self, row: int) -> bool:
+        selected = super().selectRow(row)
+        if selected:
+            self.patches.pop(row, None)
+        return selected
+
+    def row_operation(self, row: int) -> typing.Optional[str]:
+        """ Return 'insert' or 'delete' if the row is an unsubmitted insert or delete, otherwise None """
+        marker = super().headerData(row, Qt.Vertical, Qt.DisplayRole)
+        return {'*': 'insert', '!': 'delete'}.get(marker)
+
+    def pending_updates(self) -> typing.List[typing.Tuple[int, typing.Any, typing.Dict[str, typing.Any]]]:
+        """ Return (row, primary key, changed field values) of edited rows which already exist in the database - the
+            primary key is the value held in the database, before any edit """
+
+        updates = []
+        for row in sorted(self.dirty_cells):
+            if self.row_operation(row) is not None:
+                continue
+
+            changes = self.row_changes(row)
+            if changes:
+                updates.append((row, self.primaryValues(row).value(self.id_field_name), changes))
+        return updates
+
+    def pending_inserts(self) -> typing.List[typing.Tuple[int, typing.Dict[str, typing.Any]]]:
+        """ Return (row, field values) of unsubmitted new rows - only fields which have been set are included """
+        return [(row, self.row_changes(row)) for row in sorted(self.dirty_cells) if self.row_operation(row) == 'insert']
+
+    def pending_deletes(self) -> typing.List[typing.Tuple[int, typing.Any]]:
+        """ Return (row, primary key) of rows removed but not submitted """
+        return [(row, self.primaryValues(row).value(self.id_field_name))
+                for row in sorted(self.removed_rows) if self.row_operation(row) == 'delete']
+
+    # Qt override - applies values patched into the model after they were committed
+    def record(self, row: int=None) -> QSqlRecord:
+        if row is None:
+            return super().record()
+
+        record = super().record(row)
+        for column, value in self.patches.get(row, {}).items():
+            record.setValue(column, value)
+        return record
+
+    def row_changes(self, row: int) -> typing.Dict[str, typing.Any]:
+        """ Return field values of the given row which have been edited but not submitted """
+        changes = {}
+        for column in self.dirty_cells.get(row, ()):
+            index = self.index(row, column)
+            if self.isDirty(index):
+                changes[self.fields[column].name] = super().data(index, Qt.EditRole)
+        return changes
+
+    def patch_row(self, row: int, field_values: typing.Dict[str, typing.Any]) -> None:
+        """ Set values of a row which have been committed to the database by other means without a select() - the values
+            replace unsubmitted edits of the same fields, edits made to other fields or since the values were committed
+            are kept """
+
+        later_edits = {field: value for field, value in self.row_changes(row).items()
+                       if field not in field_values or value != field_values[field]}
+
+        patch = self.patches.setdefault(row, {})
+        for field, value in field_values.items():
+            patch[getattr(self, field).index] = value
+
+        # drop Qt's cached edit so it is not submitted again - this also signals the row has changed
+        self.revertRow(row)
+        for field, value in later_edits.items():
+            self.setData(self.index(row, getattr(self, field).index), value)
+
+    def get_save_queue(self) -> WriteBehindQueue:
+        """ Return the write-behind queue for the model's table, creating it on first use """
+        if self._save_queue is None:
+            self._save_queue = WriteBehindQueue(self.database().connectionName(), self.tableName(), self.id_field_name)
+        return self._save_queue
+
     def get_auto_populated_id(self):
         """ Query the db for an id """
 
-        query = QSqlQuery("SELECT nextval('{0}')".format(self.id_sequence_name))
+        query = QSqlQuery(self.database())
+        execute(query, "SELECT nextval('{0}')".format(self.id_sequence_name))
         query.next()
         return query.value(0)
 
@@ -197,6 +558,66 @@ class DatabaseModel(QSqlRelationalTableModel):
 
         return self.record(row_count), model_index
 
+    def delete_records(self, ids: typing.Iterable[typing.Any]) -> None:
+        """ Delete records by primary key using one DELETE ... WHERE id IN (...) per chunk inside a single transaction -
+            the model is not refreshed """
+
+        ids = list(ids)
+        if not ids:
+            return
+
+        database = self.database()
+        if not database.transaction():
+            raise SQLError(database.lastError().text())
+
+        try:
+            execute_deletes(database, self.tableName(), self.id_field_name, ids, self.delete_chunk_size)
+        except SQLError:
+            database.rollback()
+            raise
+
+        if not database.commit():
+            raise SQLError(database.lastError().text())
+
+    def delete_rows(self, rows: typing.Iterable[int]) -> typing.List[typing.Any]:
+        """ Delete the records at the given rows in bulk and return their primary keys - the model is not re-selected,
+            deleted rows stay loaded until the next select(), see mark_deleted(). Unsubmitted new rows are removed from
+            the model rather than deleted """
+
+        rows = set(rows)
+        inserted = {row for row in rows if self.row_operation(row) == 'insert'}
+        existing = sorted(rows - inserted - self.deleted_rows)
+
+        ids = list({self.primaryValues(row).value(self.id_field_name) for row in existing})
+        self.delete_records(ids)
+        self.mark_deleted(existing)
+
+        for row in sorted(inserted, reverse=True):
+            self.revertRow(row)
+
+        self.rows_deleted.emit(ids)
+        return ids
+
+    def mark_deleted(self, rows: typing.Iterable[int]) -> None:
+        """ Exclude rows whose records have been deleted from the database by other means without a select() - the rows
+            stay loaded, and are still counted by rowCount() and returned by record(), until the next select(). They
+            are added to deleted_rows, which filter proxies, column indexes, change subscriptions and form navigation
+            skip - other code reading the model directly rather than through a proxy must skip them too """
+
+        rows = sorted(set(rows) - self.deleted_rows)
+
+        # drop any unsubmitted edits or deletes so they are not submitted for records which no longer exist
+        for row in rows:
+            self.revertRow(row)
+            self.patches.pop(row, None)
+        self.deleted_rows.update(rows)
+
+        # signal each run of deleted rows so proxies refilter only those rows
+        last_column = self.columnCount() - 1
+        for offset, run in itertools.groupby(enumerate(rows), lambda item: item[1] - item[0]):
+            run = [row for position, row in run]
+            self.dataChanged.emit(self.index(run[0], 0), self.index(run[-1], last_column))
+
     def set_relation(self, column: int, related_table: str, related_id_field:str, related_display_field:str):
         """ Set relation so that Qt can show field values instead of ids """
 
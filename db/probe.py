@@ -0,0 +1,186 @@
+import json
+import time
+import typing
+import collections
+
+from PyQt5.QtCore import Qt, QModelIndex, QAbstractItemModel
+
+
+# role names for summaries, eg. {0: 'DisplayRole'}
+ROLE_NAMES = {getattr(Qt, name): name for name in dir(Qt) if name.endswith('Role') and isinstance(getattr(Qt, name), int)}
+
+# generated probe classes keyed by model class
+_probe_classes = {}
+
+
+def _probe_class(cls: type) -> type:
+    """ Return a subclass of the model class which records calls made by views before passing them on """
+    probe_class = _probe_classes.get(cls)
+    if probe_class is not None:
+        return probe_class
+
+    def data(self, index: QModelIndex, role: int=Qt.DisplayRole) -> typing.Any:
+        self._access_probe.calls.append(('data', index.row(), index.column(), role))
+        return cls.data(self, index, role)
+
+    def headerData(self, section: int, orientation: int, role: int=Qt.DisplayRole) -> typing.Any:
+        self._access_probe.calls.append(('headerData', section, int(orientation), role))
+        return cls.headerData(self, section, orientation, role)
+
+    def flags(self, index: QModelIndex) -> int:
+        self._access_probe.calls.append(('flags', index.row(), index.column()))
+        return cls.flags(self, index)
+
+    def filterAcceptsRow(self, row: int, parent: QModelIndex) -> bool:
+        self._access_probe.calls.append(('filterAcceptsRow', row))
+        return cls.filterAcceptsRow(self, row, parent)
+
+    def lessThan(self, left: QModelIndex, right: QModelIndex) -> bool:
+        self._access_probe.calls.append(('lessThan', left.row(), right.row(), left.column()))
+        return cls.lessThan(self, left, right)
+
+    methods = {'data': data, 'headerData': headerData, 'flags': flags, 'filterAcceptsRow': filterAcceptsRow,
+               'lessThan': lessThan}
+    namespace = {name: method for name, method in methods.items() if hasattr(cls, name)}
+    namespace['__module__'] = cls.__module__
+    probe_class = _probe_classes[cls] = type(cls.__name__, (cls,), namespace)
+    return probe_class
+
+
+class AccessProbe(object):
+    """ Records how views call a model - data(), headerData() and flags() by row, column and role, and the
+        filterAcceptsRow() and lessThan() calls of proxy models. The recording can be saved as a trace and replayed
+        against other model implementations with replay_trace(). PyQt remembers which virtual methods an instance does
+        not reimplement once Qt has called them, so methods the model's class does not override, eg. lessThan() of
+        CustomSortFilterProxyModel, are only recorded if the probe is attached before the model is used by a view
+        Params -
+            model - DatabaseModel, CustomSortFilterProxyModel or other model instance to probe"""
+
+    def __init__(self, model: QAbstractItemModel) -> None:
+        self.model = model
+        self.calls = []  # type: typing.List[tuple]
+        self._model_class = None
+
+    def attach(self) -> None:
+        """ Start recording calls - the model's class is swapped for a recording subclass """
+        if self._model_class is not None:
+            return
+        self._model_class = self.model.__class__
+        self.model._access_probe = self
+        self.model.__class__ = _probe_class(self._model_class)
+
+    def detach(self) -> None:
+        """ Stop recording calls and restore the model's class """
+        if self._model_class is None:
+            return
+        self.model.__class__ = self._model_class
+        self._model_class = None
+        del self.model._access_probe
+
+    def clear(self) -> None:
+        """ Discard recorded calls """
+        self.calls = []
+
+    def __enter__(self) -> 'AccessProbe':
+        self.attach()
+        return self
+
+    def __exit__(self, *args: typing.Any) -> None:
+        self.detach()
+
+    def summary(self) -> dict:
+        """ Return call counts by method and by role, and how many data() calls hit a cell and role which had already
+            been requested """
+
+        methods = collections.Counter(call[0] for call in self.calls)
+        roles = collections.Counter()
+        cells = collections.Counter()
+        for call in self.calls:
+            if call[0] == 'data':
+                roles[ROLE_NAMES.get(call[3], str(call[3]))] += 1
+                cells[call[1:]] += 1
+
+        return {
+            'methods': dict(methods),
+            'roles': dict(roles),
+            'distinct_cells': len(cells),
+            'repeat_hits': sum(cells.values()) - len(cells),
+            'hottest_cells': [[row, column, ROLE_NAMES.get(role, str(role)), count]
+                              for (row, column, role), count in cells.most_common(10)],
+        }
+
+    def trace(self) -> dict:
+        """ Return the recording as a trace """
+        model_class = self._model_class or self.model.__class__
+        return {
+            'model': model_class.__name__,
+            'rows': self.model.rowCount(),
+            'columns': self.model.columnCount(),
+            'calls': [list(call) for call in self.calls],
+        }
+
+    def save(self, path: str) -> None:
+        """ Save the recording as a JSON trace file """
+        with open(path, 'w') as trace_file:
+            json.dump(self.trace(), trace_file)
+
+
+def load_trace(path: str) -> dict:
+    """ Load a trace saved by AccessProbe.save() """
+    with open(path) as trace_file:
+        return json.load(trace_file)
+
+
+def replay_trace(trace: typing.Union[str, dict], model: QAbstractItemModel, repeat: int=1) -> dict:
+    """ Replay the calls of a trace against a model and return the time spent per method - rows are fetched up to the
+        highest row used by the trace, calls which the model cannot answer are skipped
+        Params -
+            trace - trace or path of a trace file
+            model - model to replay against
+            repeat - number of times to replay the trace"""
+
+    if isinstance(trace, str):
+        trace = load_trace(path=trace)
+    calls = trace['calls']
+
+    max_row = max((call[1] for call in calls if call[0] != 'headerData'), default=-1)
+    while model.rowCount() <= max_row and model.canFetchMore(QModelIndex()):
+        model.fetchMore(QModelIndex())
+
+    source = model.sourceModel() if hasattr(model, 'sourceModel') else None
+    row_count, column_count = model.rowCount(), model.columnCount()
+    source_rows = source.rowCount() if source is not None else 0
+
+    # resolve indexes before timing so only the model's methods are measured
+    prepared = []
+    skipped = 0
+    for call in calls:
+        method = call[0]
+        if method in ('data', 'flags') and call[1] < row_count and call[2] < column_count:
+            prepared.append((method, model.index(call[1], call[2]), call[3:]))
+        elif method == 'headerData':
+            prepared.append((method, call[1], (Qt.Orientation(call[2]), call[3])))
+        elif method == 'filterAcceptsRow' and source is not None and call[1] < source_rows:
+            prepared.append((method, call[1], (QModelIndex(),)))
+        elif method == 'lessThan' and source is not None and max(call[1], call[2]) < source_rows:
+            prepared.append((method, source.index(call[1], call[3]), (source.index(call[2], call[3]),)))
+        else:
+            skipped += 1
+
+    seconds = collections.defaultdict(float)
+    counts = collections.Counter()
+    for iteration in range(repeat):
+        for method, first, args in prepared:
+            function = getattr(model, method)
+            start = time.perf_counter()
+            function(first, *args)
+            seconds[method] += time.perf_counter() - start
+            counts[method] += 1
+
+    return {
+        'model': model.__class__.__name__,
+        'calls': sum(counts.values()),
+        'skipped': skipped * repeat,
+        'seconds': sum(seconds.values()),
+        'methods': {method: {'calls': counts[method], 'seconds': seconds[method]} for method in counts},
+    }
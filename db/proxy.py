@@ -17,6 +17,8 @@ class CustomSortFilterProxyModel(QSortFilterProxyModel):
         self.filter_functions = {}
 
         self.boolean_filters = {}
+        self.row_filters = {}
+        self.record_filters = {}
 
     def set_filter_string(self, text: typing.Any):
         """ Basic string filtering """
@@ -44,6 +46,26 @@ class CustomSortFilterProxyModel(QSortFilterProxyModel):
         self.boolean_filters[name] = (default, op)
         self.invalidateFilter()
 
+    def set_row_filter(self, name: str, rows: typing.Optional[typing.Container[int]], invalidate: bool=True,
+                       record_filter: typing.Callable[[QSqlRecord], bool]=None) -> None:
+        """ Restrict visible rows to a precomputed set of source rows, typically the result of an index lookup
+            Params -
+                name - name of filter
+                rows - container of accepted source row numbers, None removes the filter
+                invalidate - refresh the filtered data immediately
+                record_filter - callable accepting a QSqlRecord which accepts the same records as rows, used to filter
+                                records which are not loaded in the source model, eg. when exporting"""
+
+        if rows is None:
+            self.row_filters.pop(name, None)
+            self.record_filters.pop(name, None)
+        else:
+            self.row_filters[name] = rows
+            self.record_filters[name] = record_filter
+
+        if invalidate:
+            self.invalidateFilter()
+
     def clear_filter_functions(self) -> None:
         """ Remove all filter functions """
 
@@ -65,9 +87,36 @@ class CustomSortFilterProxyModel(QSortFilterProxyModel):
         """ Force refresh of filtered data by proxy """
         self.invalidateFilter()
 
+    def has_active_filters(self) -> bool:
+        """ Whether any filter is currently able to hide rows """
+        string_filters = bool(self.filter_functions) and not self._filter_string_empty()
+        return string_filters or bool(self.boolean_filters or self.row_filters)
+
+    def get_record_filter(self) -> typing.Optional[typing.Callable[[QSqlRecord], bool]]:
+        """ Return a callable applying the current filters to a QSqlRecord rather than a source row, or None if a row
+            filter was set without a record filter - the filters are copied so the callable can be used on a worker
+            thread while they change """
+
+        if any(self.record_filters.get(name) is None for name in self.row_filters):
+            return None
+
+        filter_string = self.filter_string
+        filter_functions = [] if self._filter_string_empty() else list(self.filter_functions.values())
+        boolean_filters = list(self.boolean_filters.items())
+        record_filters = list(self.record_filters.values())
+
+        def accepts(record: QSqlRecord) -> bool:
+            return (all(func(record, filter_string) for func in filter_functions) and
+                    all(op(record.value(field), value) for field, (value, op) in boolean_filters) and
+                    all(record_filter(record) for record_filter in record_filters))
+        return accepts
+
+    def _filter_string_empty(self) -> bool:
+        return (type(self.filter_string) is str and not self.filter_string) or self.filter_string is None
+
     def _check_string_filters(self, row: int) -> bool:
         """ Check if string filters pass for given row """
-        if (type(self.filter_string) is str and not self.filter_string) or self.filter_string is None:
+        if self._filter_string_empty():
             return True
 
         model = self.sourceModel()
@@ -80,9 +129,19 @@ class CustomSortFilterProxyModel(QSortFilterProxyModel):
         tests = [op(record.value(field), value) for field, (value, op) in self.boolean_filters.items()]
         return False not in tests
 
+    def _check_row_filters(self, row: int) -> bool:
+        """ Check if row filters pass for given row - rows deleted from the source model are never accepted """
+        if row in getattr(self.sourceModel(), 'deleted_rows', ()):
+            return False
+
+        for rows in self.row_filters.values():
+            if row not in rows:
+                return False
+        return True
+
     # QT override
     def filterAcceptsRow(self, row: int, parent: QModelIndex) -> bool:
-        return self._check_string_filters(row) and self._check_boolean_filters(row)
+        return self._check_row_filters(row) and self._check_string_filters(row) and self._check_boolean_filters(row)
 
     def get_active_indexes(self) -> typing.List[QModelIndex]:
         """ Return all visible model indexes """
@@ -1,6 +1,7 @@
-from PyQt5.QtSql import QSqlQuery
+from PyQt5.QtSql import QSqlQuery, QSqlDatabase
 
 from ..utils.logging import Log
+from .instrumentation import execute
 
 
 class SqlCalculation(Log):
@@ -29,10 +30,13 @@ class SqlCalculation(Log):
         if not self._check_args(**kwargs):
             raise KeyError('Missing arguments - requires {0}'.format(','.join(self.parameters)))
 
-        sql_query = QSqlQuery(self.query)
+        # values must be bound before the query is executed
+        sql_query = QSqlQuery()
+        sql_query.prepare(self.query)
 
         for idx, parameter in enumerate(self.parameters):
             sql_query.bindValue(idx, kwargs[parameter])
 
+        execute(sql_query, connection=QSqlDatabase.database())
         sql_query.next()
         return sql_query.value(0) or 0
\ No newline at end of file
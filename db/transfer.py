@@ -0,0 +1,621 @@
+import io
+import os
+import csv
+import json
+import typing
+import operator
+import itertools
+
+from PyQt5.QtCore import Qt, QThread, QDate, QDateTime, QTime, QByteArray, QAbstractItemModel, pyqtSignal
+from PyQt5.QtSql import QSqlDatabase, QSqlQuery, QSqlDriver, QSqlRecord
+
+from ..exceptions import ImproperlyConfigured
+from .connection import thread_connection, close_thread_connection
+from .exceptions import SQLError
+from .instrumentation import execute
+from .proxy import CustomSortFilterProxyModel
+
+
+def export_value(value: typing.Any) -> typing.Any:
+    """ Convert Qt values read from queries into plain python values """
+    if isinstance(value, (QDate, QDateTime, QTime)):
+        return value.toString(Qt.ISODate) if value.isValid() else None
+    if isinstance(value, QByteArray):
+        return bytes(value)
+    return value
+
+
+class CsvWriter(object):
+    """ Writes rows to a CSV file with a header row """
+
+    def __init__(self, path: str, fields: typing.List[str]) -> None:
+        self.file = open(path, 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(fields)
+
+    def write_rows(self, rows: typing.List[tuple]) -> None:
+        self.writer.writerows(rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JsonLinesWriter(object):
+    """ Writes rows to a file as one JSON object per line """
+
+    def __init__(self, path: str, fields: typing.List[str]) -> None:
+        self.file = open(path, 'w', encoding='utf-8')
+        self.fields = fields
+
+    def write_rows(self, rows: typing.List[tuple]) -> None:
+        self.file.writelines(json.dumps(dict(zip(self.fields, row)), default=str) + '\n' for row in rows)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class ParquetWriter(object):
+    """ Writes rows to a Parquet file with one row group per chunk - requires pyarrow """
+
+    def __init__(self, path: str, fields: typing.List[str]) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImproperlyConfigured('pyarrow must be installed to export to Parquet')
+
+        self.pyarrow = pyarrow
+        self.parquet = pyarrow.parquet
+        self.path = path
+        self.fields = fields
+        self.writer = None
+
+    def write_rows(self, rows: typing.List[tuple]) -> None:
+        pyarrow = self.pyarrow
+        columns = {field: [row[index] for row in rows] for index, field in enumerate(self.fields)}
+
+        # schema is inferred from the first chunk - columns which are entirely null are written as strings
+        if self.writer is None:
+            schema = pyarrow.Table.from_pydict(columns).schema
+            schema = pyarrow.schema([pyarrow.field(field.name, pyarrow.string())
+                                     if pyarrow.types.is_null(field.type) else field for field in schema])
+            self.writer = self.parquet.ParquetWriter(self.path, schema)
+
+        self.writer.write_table(pyarrow.Table.from_pydict(columns, schema=self.writer.schema))
+
+    def close(self) -> None:
+        if self.writer is None:
+            self.write_rows([])
+        self.writer.close()
+
+
+export_writers = {
+    'csv': CsvWriter,
+    'jsonl': JsonLinesWriter,
+    'parquet': ParquetWriter
+}
+
+
+def read_csv(path: str, encoding: str='utf-8') -> typing.Iterator[typing.Tuple[int, typing.Dict[str, typing.Any]]]:
+    """ Yield line numbers and rows of a CSV file with a header row - empty values are read as null """
+    with open(path, newline='', encoding=encoding) as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            yield reader.line_num, {column: value if value != '' else None for column, value in row.items()}
+
+
+def read_jsonl(path: str, encoding: str='utf-8') -> typing.Iterator[typing.Tuple[int, typing.Dict[str, typing.Any]]]:
+    """ Yield line numbers and rows of a file with one JSON object per line - lines which are not objects are yielded
+        as the error message """
+    with open(path, encoding=encoding) as file:
+        for line_number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as error:
+                yield line_number, str(error)
+                continue
+            yield line_number, row if isinstance(row, dict) else 'Expected a JSON object'
+
+
+import_readers = {
+    'csv': read_csv,
+    'jsonl': read_jsonl
+}
+
+
+class ExportWorker(QThread):
+    """ Streams the rows of a select statement to a file in chunks on a worker thread with its own connection - on
+        PostgreSQL rows are read through a server side cursor
+        Params -
+            connection_name - name of the connection to clone for the worker
+            statement - select statement to export
+            path - output file path
+            export_format - csv, jsonl or parquet
+            id_field - primary key field, required when ids are supplied
+            ids - only export rows with these primary keys, in this order
+            chunk_size - number of rows read and written at a time
+            record_filter - only export records accepted by this callable, which is called on the worker thread
+        Events -
+            progress - number of rows written so far
+            exported - total number of rows written, fired when the export completes
+            failed - fired with an error message if the export fails"""
+
+    progress = pyqtSignal(int)
+    exported = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    chunk_size = 5000
+    id_chunk_size = 500
+
+    def __init__(self, connection_name: str, statement: str, path: str, export_format: str, id_field: str=None,
+                 ids: typing.List[typing.Any]=None, chunk_size: int=None,
+                 record_filter: typing.Callable[[QSqlRecord], bool]=None) -> None:
+        super().__init__()
+
+        if export_format not in export_writers:
+            raise ImproperlyConfigured('Unknown export format {0}'.format(export_format))
+
+        self.connection_name = connection_name
+        self.statement = statement
+        self.path = path
+        self.export_format = export_format
+        self.id_field = id_field
+        self.ids = ids
+        self.row_count = len(ids) if ids is not None else None
+        self.record_filter = record_filter
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+    def cancel(self) -> None:
+        """ Stop the export after the current chunk and remove the partially written file """
+        self.requestInterruption()
+
+    # QT override
+    def run(self) -> None:
+        error = None
+        try:
+            count = self._export()
+        except (SQLError, ImproperlyConfigured, OSError, ValueError, TypeError) as export_error:
+            # pyarrow raises ValueError and TypeError subclasses for values it cannot convert
+            error = str(export_error)
+
+        # queries must be released before the connection is removed
+        close_thread_connection(self.connection_name)
+
+        if error is not None:
+            self.failed.emit(error)
+        elif self.isInterruptionRequested():
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        else:
+            self.exported.emit(count)
+
+    def _export(self) -> int:
+        connection = thread_connection(self.connection_name)
+        query = QSqlQuery(connection)
+        query.setForwardOnly(True)
+
+        if self.ids is not None:
+            chunks = self._id_chunks(connection, query)
+        elif connection.driverName() == 'QPSQL':
+            chunks = self._cursor_chunks(connection, query)
+        else:
+            chunks = self._query_chunks(query)
+
+        writer = None
+        count = 0
+        try:
+            for fields, rows in chunks:
+                if writer is None:
+                    writer = export_writers[self.export_format](self.path, fields)
+                if rows:
+                    writer.write_rows(rows)
+                count += len(rows)
+                self.progress.emit(count)
+
+                if self.isInterruptionRequested():
+                    break
+        finally:
+            if writer is not None:
+                writer.close()
+
+        return count
+
+    @staticmethod
+    def _exec(query: QSqlQuery, statement: str=None) -> None:
+        executed = execute(query, statement)
+        if not executed:
+            raise SQLError(query.lastError().text())
+
+    @staticmethod
+    def _fields(query: QSqlQuery) -> typing.List[str]:
+        record = query.record()
+        return [record.fieldName(column) for column in range(record.count())]
+
+    def _fetch(self, query: QSqlQuery, column_count: int, limit: int=None) -> typing.Tuple[typing.List[tuple], int]:
+        """ Read up to limit rows, returning the rows accepted by the record filter and the number of rows read """
+        rows = []
+        read = 0
+        record_filter = self.record_filter
+        while (limit is None or read < limit) and query.next():
+            read += 1
+            if record_filter is not None and not record_filter(query.record()):
+                continue
+            rows.append(tuple(export_value(query.value(column)) for column in range(column_count)))
+        return rows, read
+
+    def _query_chunks(self, query: QSqlQuery) -> typing.Iterator[typing.Tuple[typing.List[str], list]]:
+        self._exec(query, self.statement)
+        fields = self._fields(query)
+        while True:
+            rows, read = self._fetch(query, len(fields), self.chunk_size)
+            if not read:
+                break
+            yield fields, rows
+
+    def _cursor_chunks(self, connection: QSqlDatabase, query: QSqlQuery) -> typing.Iterator[typing.Tuple[typing.List[str], list]]:
+        # cursors only live inside a transaction, which is rolled back as nothing is written
+        connection.transaction()
+        try:
+            self._exec(query, 'DECLARE export_cursor NO SCROLL CURSOR FOR {0}'.format(self.statement))
+            while True:
+                self._exec(query, 'FETCH FORWARD {0} FROM export_cursor'.format(self.chunk_size))
+                fields = self._fields(query)
+                rows, read = self._fetch(query, len(fields))
+                if not read:
+                    break
+                yield fields, rows
+        finally:
+            query.finish()
+            connection.rollback()
+
+    def _id_chunks(self, connection: QSqlDatabase, query: QSqlQuery) -> typing.Iterator[typing.Tuple[typing.List[str], list]]:
+        id_field = connection.driver().escapeIdentifier(self.id_field, QSqlDriver.FieldName)
+
+        for start in range(0, len(self.ids), self.id_chunk_size):
+            ids = self.ids[start:start + self.id_chunk_size]
+            query.prepare('SELECT * FROM ({0}) AS export WHERE export.{1} IN ({2})'.format(
+                self.statement, id_field, ', '.join('?' * len(ids))))
+            for id_value in ids:
+                query.addBindValue(id_value)
+            self._exec(query)
+
+            fields = self._fields(query)
+            id_column = fields.index(self.id_field)
+            rows = {row[id_column]: row for row in self._fetch(query, len(fields))[0]}
+
+            # keep the order rows are displayed in
+            yield fields, [rows[id_value] for id_value in ids if id_value in rows]
+
+
+def export_model(model: QAbstractItemModel, path: str, export_format: str=None, chunk_size: int=None) -> ExportWorker:
+    """ Create a worker which exports the rows of a database model or the rows visible through a filter proxy - the
+        model's own filter and sort, and the proxy's sort column, are pushed down to the export query. Proxy filters
+        are applied to records on the worker thread, so rows which have not been loaded are not fetched into the model.
+        Only a row filter set without a record filter requires every row to be loaded to export the visible rows by
+        primary key
+        Params -
+            model - DatabaseModel or CustomSortFilterProxyModel
+            path - output file path
+            export_format - csv, jsonl or parquet, taken from the path's extension if not supplied
+            chunk_size - number of rows read and written at a time"""
+
+    export_format = export_format or os.path.splitext(path)[1].lstrip('.').lower()
+
+    ids = None
+    record_filter = None
+    source_model = model.sourceModel() if isinstance(model, CustomSortFilterProxyModel) else model
+    statement = source_model.selectStatement()
+    if isinstance(model, CustomSortFilterProxyModel):
+        record_filter = model.get_record_filter() if model.has_active_filters() else None
+        if model.has_active_filters() and record_filter is None:
+            # the row filter cannot be applied to records - load every row to find the visible primary keys
+            while source_model.canFetchMore():
+                source_model.fetchMore()
+
+            id_column = source_model.fieldIndex(source_model.id_field_name)
+            ids = [source_model.data(model.mapToSource(model.index(row, id_column)), Qt.EditRole)
+                   for row in range(model.rowCount())]
+
+        elif model.sortColumn() >= 0:
+            statement = sorted_statement(source_model, statement, model.sortColumn(), model.sortOrder())
+
+    return ExportWorker(source_model.database().connectionName(), statement, path, export_format,
+                        source_model.id_field_name, ids, chunk_size, record_filter)
+
+
+def sorted_statement(model: QAbstractItemModel, statement: str, column: int, order: int) -> str:
+    """ Return the statement ordered by a column of the model, as a proxy sorted on that column displays it - rows are
+        ordered by their database values rather than their display text
+        Params -
+            model - database model the statement selects from
+            statement - select statement
+            column - column to order by
+            order - Qt.AscendingOrder or Qt.DescendingOrder"""
+
+    field = model.database().driver().escapeIdentifier(model.record().fieldName(column), QSqlDriver.FieldName)
+    return 'SELECT * FROM ({0}) AS export ORDER BY export.{1} {2}'.format(
+        statement, field, 'DESC' if order == Qt.DescendingOrder else 'ASC')
+
+
+class ImportWorker(QThread):
+    """ Streams rows from a CSV or JSON Lines file into a table on a worker thread with its own connection - rows are
+        inserted with batched prepared statements, or COPY on PostgreSQL when psycopg2 is installed, in one
+        transaction per chunk. Each row binds only the fields it supplies, consecutive rows supplying the same fields
+        are batched together. Rows which fail are collected in rejected_rows rather than aborting the import
+        Params -
+            connection_name - name of the connection to clone for the worker
+            table - table to insert into
+            record - empty record of the table's fields
+            path - input file path
+            import_format - csv or jsonl
+            mapping - map of input column names to field names, columns are matched by name if not supplied
+            auto_populate - list of (field name, callback) for fields populated from the record when not supplied
+            id_field - primary key field to populate from id_sequence when not supplied
+            id_sequence - sequence used to generate ids
+            copy_parameters - psycopg2 connection parameters, enables COPY
+            chunk_size - number of rows inserted per transaction
+            encoding - text encoding of the input file
+        Events -
+            progress - number of rows processed so far
+            imported - number of rows inserted and rejected, fired when the import completes
+            failed - fired with an error message if the import fails"""
+
+    progress = pyqtSignal(int)
+    imported = pyqtSignal(int, int)
+    failed = pyqtSignal(str)
+
+    chunk_size = 1000
+
+    def __init__(self, connection_name: str, table: str, record: QSqlRecord, path: str, import_format: str,
+                 mapping: typing.Dict[str, str]=None,
+                 auto_populate: typing.List[typing.Tuple[str, typing.Callable]]=None, id_field: str=None,
+                 id_sequence: str=None, copy_parameters: typing.Dict[str, typing.Any]=None, chunk_size: int=None,
+                 encoding: str='utf-8') -> None:
+        super().__init__()
+
+        if import_format not in import_readers:
+            raise ImproperlyConfigured('Unknown import format {0}'.format(import_format))
+
+        self.connection_name = connection_name
+        self.table = table
+        self.record = record
+        self.path = path
+        self.import_format = import_format
+        self.mapping = mapping or {}
+        self.auto_populate = auto_populate or []
+        self.id_field = id_field
+        self.id_sequence = id_sequence
+        self.copy_parameters = copy_parameters
+        self.encoding = encoding
+        if chunk_size:
+            self.chunk_size = chunk_size
+
+        self.rejected_rows = []  # type: typing.List[typing.Tuple[int, typing.Any, str]]
+
+    def cancel(self) -> None:
+        """ Stop the import after the current chunk - chunks already committed are kept """
+        self.requestInterruption()
+
+    # QT override
+    def run(self) -> None:
+        error = None
+        try:
+            inserted = self._import()
+        except Exception as import_error:
+            # an exception escaping run() aborts the application - decoding, csv and driver errors are reported
+            error = str(import_error) or import_error.__class__.__name__
+        finally:
+            # queries must be released before the connection is removed
+            close_thread_connection(self.connection_name)
+
+        if error is not None:
+            self.failed.emit(error)
+        else:
+            self.imported.emit(inserted, len(self.rejected_rows))
+
+    def _import(self) -> int:
+        connection = thread_connection(self.connection_name)
+        copy_connection = self._copy_connection()
+
+        inserted = 0
+        processed = 0
+        chunk = []
+        try:
+            for line_number, row in import_readers[self.import_format](self.path, self.encoding):
+                processed += 1
+                if isinstance(row, str):
+                    self.rejected_rows.append((line_number, None, row))
+                    continue
+
+                try:
+                    fields, values, generated_id = self._row_values(row)
+                except Exception as error:
+                    # auto populate callbacks are user code
+                    self.rejected_rows.append((line_number, row, str(error)))
+                    continue
+                chunk.append((line_number, row, fields, values, generated_id))
+
+                if len(chunk) >= self.chunk_size:
+                    inserted += self._insert_chunk(connection, copy_connection, chunk)
+                    chunk = []
+                    self.progress.emit(processed)
+
+                    if self.isInterruptionRequested():
+                        return inserted
+
+            if chunk:
+                inserted += self._insert_chunk(connection, copy_connection, chunk)
+            self.progress.emit(processed)
+        finally:
+            if copy_connection is not None:
+                copy_connection.close()
+
+        return inserted
+
+    def _copy_connection(self) -> typing.Any:
+        if not self.copy_parameters:
+            return None
+        try:
+            import psycopg2
+        except ImportError:
+            return None
+        return psycopg2.connect(**self.copy_parameters)
+
+    def _row_values(self, row: typing.Dict[str, typing.Any]
+                    ) -> typing.Tuple[typing.Tuple[str, ...], typing.List[typing.Any], bool]:
+        """ Map an input row onto the table's fields and return the supplied fields in table order, their values and
+            whether the id field was added to be generated from the id sequence """
+        record = QSqlRecord(self.record)
+        supplied = set()
+        for column, value in row.items():
+            field = self.mapping.get(column, column)
+            if record.indexOf(field) != -1:
+                record.setValue(field, value)
+                supplied.add(field)
+
+        for field, callback in self.auto_populate:
+            if field not in supplied:
+                record.setValue(field, callback(record))
+                supplied.add(field)
+
+        fields = [record.fieldName(column) for column in range(record.count()) if record.fieldName(column) in supplied]
+        values = [export_value(record.value(field)) for field in fields]
+
+        generated_id = bool(self.id_field and self.id_sequence and self.id_field not in supplied)
+        if generated_id:
+            fields.append(self.id_field)
+            values.append(None)
+
+        return tuple(fields), values, generated_id
+
+    def _next_ids(self, connection: QSqlDatabase, rows: list) -> None:
+        """ Fill generated ids for a chunk - with a single query on PostgreSQL, otherwise one query per id """
+        rows = [values for line_number, row, fields, values, generated_id in rows if generated_id]
+        if not rows:
+            return
+
+        query = QSqlQuery(connection)
+        sequence = "nextval('{0}')".format(self.id_sequence.replace("'", "''"))
+        if connection.driverName() == 'QPSQL':
+            if not query.exec_('SELECT {0} FROM generate_series(1, {1})'.format(sequence, len(rows))):
+                raise SQLError(query.lastError().text())
+            for values in rows:
+                query.next()
+                values[-1] = query.value(0)
+            return
+
+        for values in rows:
+            if not query.exec_('SELECT {0}'.format(sequence)) or not query.next():
+                raise SQLError(query.lastError().text())
+            values[-1] = query.value(0)
+
+    def _insert_chunk(self, connection: QSqlDatabase, copy_connection: typing.Any, rows: list) -> int:
+        self._next_ids(connection, rows)
+
+        inserted = 0
+        for fields, group in itertools.groupby(rows, operator.itemgetter(2)):
+            inserted += self._insert_rows(connection, copy_connection, fields, list(group))
+        return inserted
+
+    def _insert_rows(self, connection: QSqlDatabase, copy_connection: typing.Any, fields: typing.Tuple[str, ...],
+                     rows: list) -> int:
+        """ Insert rows which supply the same fields """
+        driver = connection.driver()
+        table = driver.escapeIdentifier(self.table, QSqlDriver.TableName)
+        columns = ', '.join(driver.escapeIdentifier(field, QSqlDriver.FieldName) for field in fields)
+
+        if copy_connection is not None and self._copy_chunk(copy_connection, table, columns, rows):
+            return len(rows)
+
+        statement = 'INSERT INTO {0} ({1}) VALUES ({2})'.format(table, columns, ', '.join('?' * len(fields)))
+
+        query = QSqlQuery(connection)
+        if not connection.transaction():
+            raise SQLError(connection.lastError().text())
+
+        query.prepare(statement)
+        for column in range(len(fields)):
+            query.addBindValue([values[column] for line_number, row, row_fields, values, generated_id in rows])
+        if execute(query, batch=True) and connection.commit():
+            return len(rows)
+        connection.rollback()
+
+        # find the rows at fault - each row gets a savepoint so one failure does not abort the transaction
+        inserted = 0
+        savepoint = QSqlQuery(connection)
+        connection.transaction()
+        query.prepare(statement)
+        for line_number, row, row_fields, values, generated_id in rows:
+            savepoint.exec_('SAVEPOINT import_row')
+            for value in values:
+                query.addBindValue(value)
+            if query.exec_():
+                savepoint.exec_('RELEASE SAVEPOINT import_row')
+                inserted += 1
+            else:
+                self.rejected_rows.append((line_number, row, query.lastError().text()))
+                savepoint.exec_('ROLLBACK TO SAVEPOINT import_row')
+
+        if not connection.commit():
+            raise SQLError(connection.lastError().text())
+        return inserted
+
+    def _copy_chunk(self, copy_connection: typing.Any, table: str, columns: str, rows: list) -> bool:
+        """ Insert rows with COPY into the escaped table and columns - returns False if the rows should be retried with
+            inserts """
+
+        def copy_value(value: typing.Any) -> str:
+            if value is None:
+                return '\\N'
+            return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+        data = io.StringIO()
+        for line_number, row, fields, values, generated_id in rows:
+            data.write('\t'.join(copy_value(value) for value in values) + '\n')
+        data.seek(0)
+
+        try:
+            with copy_connection.cursor() as cursor:
+                cursor.copy_expert('COPY {0} ({1}) FROM STDIN'.format(table, columns), data)
+            copy_connection.commit()
+        except Exception:
+            copy_connection.rollback()
+            return False
+        return True
+
+
+def import_model(model: QAbstractItemModel, path: str, import_format: str=None, mapping: typing.Dict[str, str]=None,
+                 chunk_size: int=None, encoding: str='utf-8') -> ImportWorker:
+    """ Create a worker which imports a CSV or JSON Lines file into a database model's table - fields are populated
+        using the model's auto_populate callbacks and id sequence, which must be safe to call from the worker thread.
+        The model is not refreshed
+        Params -
+            model - DatabaseModel
+            path - input file path
+            import_format - csv or jsonl, taken from the path's extension if not supplied
+            mapping - map of input column names to field names
+            chunk_size - number of rows inserted per transaction
+            encoding - text encoding of the input file"""
+
+    import_format = import_format or os.path.splitext(path)[1].lstrip('.').lower()
+
+    database = model.database()
+    auto_populate = [(field.name, field.auto_populate) for field in model.fields if field.auto_populate]
+    id_sequence = model.id_sequence_name if model.auto_populate_id else None
+
+    copy_parameters = None
+    if database.driverName() == 'QPSQL':
+        copy_parameters = {
+            'host': database.hostName(),
+            'port': database.port() if database.port() != -1 else 5432,
+            'dbname': database.databaseName(),
+            'user': database.userName(),
+            'password': database.password()
+        }
+
+    return ImportWorker(database.connectionName(), model.tableName(), database.record(model.tableName()), path,
+                        import_format, mapping, auto_populate, model.id_field_name, id_sequence, copy_parameters,
+                        chunk_size, encoding)
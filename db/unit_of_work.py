@@ -0,0 +1,74 @@
+import typing
+
+from .model import DatabaseModel
+from .writer import execute_inserts, execute_updates, execute_deletes
+from .exceptions import SQLError
+from ..exceptions import ImproperlyConfigured
+
+
+class UnitOfWork(object):
+    """ Collects the unsubmitted changes of a model and its related models and commits them in one transaction with
+        batched statements - inserts and updates are written parents first and deletes children first so foreign keys
+        are satisfied. Models with inserts or deletes are re-selected afterwards, updated rows are patched in place
+        Params -
+            models - models sharing a connection, parents before children"""
+
+    def __init__(self, *models: DatabaseModel) -> None:
+        self.models = []  # type: typing.List[DatabaseModel]
+        for model in models:
+            self.add(model)
+
+    def add(self, model: DatabaseModel) -> None:
+        """ Add a model to the unit of work - it must be added after any model it references """
+        if self.models and model.database().connectionName() != self.models[0].database().connectionName():
+            raise ImproperlyConfigured('Models in a unit of work must share a connection')
+        if model not in self.models:
+            self.models.append(model)
+
+    def pending_changes(self) -> typing.List[typing.Tuple[DatabaseModel, list, list, list]]:
+        """ Return (model, inserts, updates, deletes) for each model with unsubmitted changes """
+        changes = []
+        for model in self.models:
+            inserts, updates, deletes = model.pending_inserts(), model.pending_updates(), model.pending_deletes()
+            if inserts or updates or deletes:
+                changes.append((model, inserts, updates, deletes))
+        return changes
+
+    def has_changes(self) -> bool:
+        """ Whether any model has unsubmitted changes """
+        return bool(self.pending_changes())
+
+    def commit(self) -> None:
+        """ Write every pending change in a single transaction - nothing is written if any statement fails and the
+            models keep their unsubmitted changes """
+
+        changes = self.pending_changes()
+        if not changes:
+            return
+
+        database = self.models[0].database()
+        if not database.transaction():
+            raise SQLError(database.lastError().text())
+
+        try:
+            for model, inserts, updates, deletes in changes:
+                execute_inserts(database, model.tableName(), [values for row, values in inserts])
+                execute_updates(database, model.tableName(), model.id_field_name,
+                                [(id_value, values) for row, id_value, values in updates])
+
+            for model, inserts, updates, deletes in reversed(changes):
+                execute_deletes(database, model.tableName(), model.id_field_name,
+                                [id_value for row, id_value in deletes], model.delete_chunk_size)
+
+            if not database.commit():
+                raise SQLError(database.lastError().text())
+        except SQLError:
+            database.rollback()
+            raise
+
+        for model, inserts, updates, deletes in changes:
+            if inserts or deletes:
+                model.select()
+            else:
+                for row, id_value, values in updates:
+                    model.patch_row(row, values)
@@ -0,0 +1,230 @@
+import typing
+import collections
+
+from PyQt5.QtCore import QObject, QThread, QTimer, QCoreApplication, pyqtSignal, pyqtSlot
+from PyQt5.QtSql import QSqlDatabase, QSqlQuery, QSqlDriver
+
+from .connection import thread_connection, close_thread_connection
+from .exceptions import SQLError
+from .instrumentation import execute
+
+
+def update_statement(driver: QSqlDriver, table: str, id_field: str, fields: typing.Sequence[str]) -> str:
+    """ Return an UPDATE statement setting only the given fields of the row with a bound primary key """
+    assignments = ', '.join('{0} = ?'.format(driver.escapeIdentifier(field, QSqlDriver.FieldName)) for field in fields)
+    return 'UPDATE {0} SET {1} WHERE {2} = ?'.format(driver.escapeIdentifier(table, QSqlDriver.TableName),
+                                                      assignments, driver.escapeIdentifier(id_field, QSqlDriver.FieldName))
+
+
+def execute_updates(connection: QSqlDatabase, table: str, id_field: str,
+                    changes: typing.List[typing.Tuple[typing.Any, typing.Dict[str, typing.Any]]]) -> None:
+    """ Execute row updates as batched prepared statements, one batch per distinct set of changed fields - the caller
+        is responsible for the transaction
+        Params -
+            connection - connection to execute on
+            table - table to update
+            id_field - primary key field
+            changes - list of (primary key, {field: value}) of changed fields"""
+
+    batches = collections.OrderedDict()
+    for id_value, values in changes:
+        batches.setdefault(tuple(sorted(values)), []).append((id_value, values))
+
+    query = QSqlQuery(connection)
+    for fields, rows in batches.items():
+        query.prepare(update_statement(connection.driver(), table, id_field, fields))
+        for field in fields:
+            query.addBindValue([values[field] for id_value, values in rows])
+        query.addBindValue([id_value for id_value, values in rows])
+
+        if not execute(query, batch=True):
+            raise SQLError(query.lastError().text())
+
+
+def insert_statement(driver: QSqlDriver, table: str, fields: typing.Sequence[str]) -> str:
+    """ Return an INSERT statement for the given fields with bound values """
+    return 'INSERT INTO {0} ({1}) VALUES ({2})'.format(
+        driver.escapeIdentifier(table, QSqlDriver.TableName),
+        ', '.join(driver.escapeIdentifier(field, QSqlDriver.FieldName) for field in fields), ', '.join('?' * len(fields)))
+
+
+def execute_inserts(connection: QSqlDatabase, table: str, rows: typing.List[typing.Dict[str, typing.Any]]) -> None:
+    """ Execute row inserts as batched prepared statements, one batch per distinct set of fields - the caller is
+        responsible for the transaction
+        Params -
+            connection - connection to execute on
+            table - table to insert into
+            rows - list of {field: value} of new rows"""
+
+    batches = collections.OrderedDict()
+    for values in rows:
+        batches.setdefault(tuple(sorted(values)), []).append(values)
+
+    query = QSqlQuery(connection)
+    for fields, batch in batches.items():
+        query.prepare(insert_statement(connection.driver(), table, fields))
+        for field in fields:
+            query.addBindValue([values[field] for values in batch])
+
+        if not execute(query, batch=True):
+            raise SQLError(query.lastError().text())
+
+
+def execute_deletes(connection: QSqlDatabase, table: str, id_field: str, ids: typing.List[typing.Any],
+                    chunk_size: int=500) -> None:
+    """ Delete rows by primary key with one DELETE ... WHERE id IN (...) per chunk - the caller is responsible for the
+        transaction
+        Params -
+            connection - connection to execute on
+            table - table to delete from
+            id_field - primary key field
+            ids - primary keys of rows to delete
+            chunk_size - maximum number of ids per statement"""
+
+    driver = connection.driver()
+    table = driver.escapeIdentifier(table, QSqlDriver.TableName)
+    id_field = driver.escapeIdentifier(id_field, QSqlDriver.FieldName)
+
+    query = QSqlQuery(connection)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        query.prepare('DELETE FROM {0} WHERE {1} IN ({2})'.format(table, id_field, ', '.join('?' * len(chunk))))
+        for id_value in chunk:
+            query.addBindValue(id_value)
+
+        if not execute(query, connection=connection):
+            raise SQLError(query.lastError().text())
+
+
+class SaveWorker(QObject):
+    """ Commits batches of row changes on a worker thread - not instantiated by user """
+
+    written = pyqtSignal(int)
+    failed = pyqtSignal(int, str)
+
+    def __init__(self, connection_name: str, table: str, id_field: str) -> None:
+        super().__init__()
+
+        self.connection_name = connection_name
+        self.table = table
+        self.id_field = id_field
+
+    @pyqtSlot(int, list)
+    def write(self, batch_id: int, changes: list) -> None:
+        error = None
+        try:
+            connection = thread_connection(self.connection_name)
+            if not connection.transaction():
+                raise SQLError(connection.lastError().text())
+
+            try:
+                execute_updates(connection, self.table, self.id_field, changes)
+            except SQLError:
+                connection.rollback()
+                raise
+
+            if not connection.commit():
+                raise SQLError(connection.lastError().text())
+        except SQLError as write_error:
+            error = str(write_error)
+
+        if error is None:
+            self.written.emit(batch_id)
+        else:
+            self.failed.emit(batch_id, error)
+
+    @pyqtSlot()
+    def close(self) -> None:
+        close_thread_connection(self.connection_name)
+
+
+class WriteBehindQueue(QObject):
+    """ Collects row changes, coalescing repeated changes to the same row, and commits them in batches on a worker
+        thread with its own connection
+        Params -
+            connection_name - name of the connection to clone for the worker
+            table - table to update
+            id_field - primary key field
+            flush_interval - milliseconds to wait for further changes before committing
+        Events -
+            saved - fired with the primary keys of rows which have been committed
+            failed - fired with the primary keys of rows which could not be committed and the error message"""
+
+    saved = pyqtSignal(list)
+    failed = pyqtSignal(list, str)
+
+    _write = pyqtSignal(int, list)
+    _close = pyqtSignal()
+
+    flush_interval = 250
+
+    def __init__(self, connection_name: str, table: str, id_field: str, flush_interval: int=None) -> None:
+        super().__init__()
+
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+
+        self.pending = collections.OrderedDict()
+        self.in_flight = {}  # type: typing.Dict[int, typing.List[typing.Any]]
+        self._batch_id = 0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+
+        self._thread = QThread()
+        self._worker = SaveWorker(connection_name, table, id_field)
+        self._worker.moveToThread(self._thread)
+        self._write.connect(self._worker.write)
+        self._close.connect(self._worker.close)
+        self._worker.written.connect(self._written)
+        self._worker.failed.connect(self._failed)
+        self._thread.start()
+
+        # without an application the owner must close the queue
+        application = QCoreApplication.instance()
+        if application is not None:
+            application.aboutToQuit.connect(self.close)
+
+    def enqueue(self, id_value: typing.Any, values: typing.Dict[str, typing.Any]) -> None:
+        """ Queue changed field values of a row - changes to a row which has not been written yet are merged """
+        self.pending.setdefault(id_value, {}).update(values)
+        self._timer.start(self.flush_interval)
+
+    def flush(self) -> None:
+        """ Send all pending changes to the worker as one batch """
+        self._timer.stop()
+        if not self.pending:
+            return
+
+        self._batch_id += 1
+        changes = list(self.pending.items())
+        self.pending = collections.OrderedDict()
+        self.in_flight[self._batch_id] = [id_value for id_value, values in changes]
+        self._write.emit(self._batch_id, changes)
+
+    def is_queued(self, id_value: typing.Any) -> bool:
+        """ Whether changes to the row with the given primary key are waiting to be committed or being committed """
+        return id_value in self.pending or any(id_value in ids for ids in self.in_flight.values())
+
+    def is_idle(self) -> bool:
+        """ Whether every queued change has been committed or has failed """
+        return not self.pending and not self.in_flight
+
+    def close(self) -> None:
+        """ Commit pending changes and stop the worker thread """
+        if not self._thread.isRunning():
+            return
+
+        self.flush()
+        self._close.emit()
+        self._thread.quit()
+        self._thread.wait()
+
+    # worker batch written event handler
+    def _written(self, batch_id: int) -> None:
+        self.saved.emit(self.in_flight.pop(batch_id, []))
+
+    # worker batch failed event handler
+    def _failed(self, batch_id: int, error: str) -> None:
+        self.failed.emit(self.in_flight.pop(batch_id, []), error)
@@ -6,7 +6,6 @@ from PyQt5.QtWidgets import QApplication
 from db.model import DatabaseModel
 from views.record_table import RecordTableView
 from views.record_form import RecordFormView
-from assets import resources
 
 # application and database setup
 application = QApplication(sys.argv)
@@ -19,11 +18,6 @@ database.setUserName('*******')
 database.setPassword('*******')
 assert database.open()
 
-from assets import resources
-from db.model import DatabaseModel
-from views.record_table import RecordTableView
-from views.record_form import RecordFormView
-
 
 # setup database model
 class OrderModel(DatabaseModel):
@@ -0,0 +1,8 @@
+import abc
+
+from PyQt5.QtCore import QObject
+
+
+class QObjectABCMeta(type(QObject), abc.ABCMeta):
+    """ Metaclass for abstract QObject subclasses - Qt's metaclass does not derive from ABCMeta, so QObjects can only
+        declare abc.abstractmethod methods through this combined metaclass """
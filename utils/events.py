@@ -1,3 +1,5 @@
+import typing
+
 from .logging import Log
 
 
@@ -8,43 +10,67 @@ class EventConnector(Log):
         # initiate logging on events
         Log.trace(self)
 
-    def connect(self) -> None:
-        """ Automatically connect event handlers named as [attr/obj name]*__[event name]
-            eg. window__save_btn__click"""
+    @classmethod
+    def connection_plan(cls) -> typing.List[typing.Tuple[str, typing.Tuple[str, ...], str, str]]:
+        """ Return (handler name, attribute path, Qt signal name, python signal name) for each event handler of the
+            class - handler names are parsed once per class and cached """
 
-        events = [attribute for attribute in dir(self) if attribute.endswith('__event') and not attribute.startswith('_x_')]
+        plan = cls.__dict__.get('_event_plan')
+        if plan is not None:
+            return plan
+
+        plan = []
+        events = [attribute for attribute in dir(cls) if attribute.endswith('__event') and not attribute.startswith('_x_')]
         for event in events:
             parts = event.split('__')
             event_name = parts[-2].replace('_', ' ').title().replace(' ', '')
             py_event_name = parts[-2]
             qt_event_name = (event_name[0].lower() + event_name[1:])
-            path = parts[:-2]
-
-            # loop through path so we can have event handlers for child elements
-            attr = self
-            flag = False
-            while path and not flag:
-                try:
-                    attr = getattr(attr, path[0])
-                except AttributeError:
-                    break
-                path.pop(0)
-
-            if flag:
-                self._logger.error('event connector attribute not found - {0} of {1}'.format(path[0], event))
-                continue
+            plan.append((event, tuple(parts[:-2]), qt_event_name, py_event_name))
+
+        cls._event_plan = plan
+        return plan
 
+    def _resolve(self, path: typing.Tuple[str, ...], qt_event_name: str, py_event_name: str):
+        """ Return the signal at the end of an attribute path, or the name of the first part which could not be found """
+        attr = self
+        for part in path:
             try:
-                qt_signal = getattr(attr, qt_event_name)
+                attr = getattr(attr, part)
             except AttributeError:
-                self._logger.error('event connector signal not found {0}, trying {1}'.format(qt_event_name, py_event_name))
-                try:
-                    qt_signal = getattr(attr, py_event_name)
-                except AttributeError:
-                    self._logger.error('event connector signal not found {0}'.format(py_event_name))
-                    continue
+                return None, part
 
+        qt_signal = getattr(attr, qt_event_name, None)
+        if qt_signal is None:
+            qt_signal = getattr(attr, py_event_name, None)
+        if qt_signal is None:
+            return None, qt_event_name
+        return qt_signal, None
+
+    def connect(self) -> None:
+        """ Automatically connect event handlers named as [attr/obj name]*__[event name]
+            eg. window__save_btn__click - handlers which cannot be connected are skipped, use validate() to report them"""
+
+        for event, path, qt_event_name, py_event_name in self.connection_plan():
+            qt_signal, missing = self._resolve(path, qt_event_name, py_event_name)
+            if qt_signal is None:
+                continue
             qt_signal.connect(getattr(self, event))
+            self._logger.debug('connected %s event to %s', qt_event_name, event)
+
+    def validate(self) -> typing.List[str]:
+        """ Return and log an error for each event handler whose attribute or signal cannot be found - a development
+            aid, connect() does not check handlers """
 
-            self._logger.debug('connected {0} event to {1}'.format(qt_event_name, event))
+        errors = []
+        for event, path, qt_event_name, py_event_name in self.connection_plan():
+            qt_signal, missing = self._resolve(path, qt_event_name, py_event_name)
+            if missing == qt_event_name:
+                errors.append('event connector signal not found {0} or {1} for {2}'.format(qt_event_name, py_event_name,
+                                                                                          event))
+            elif missing is not None:
+                errors.append('event connector attribute not found - {0} of {1}'.format(missing, event))
 
+        for error in errors:
+            self._logger.error(error)
+        return errors
@@ -1,47 +1,285 @@
 from PyQt5.QtCore import QObject
 
+import sys
+import json
+import time
+import bisect
+import random
+import reprlib
 import logging
 import inspect
+import threading
 import functools
+import collections
+
+
+# tracing options - wrappers are only installed while tracing or profiling is enabled or DEBUG is on for the class
+_tracing = {'enabled': False, 'profile': False, 'sample_rate': 1.0}
+
+# recent traced calls as (time, name, args, kwargs, result or exception) - values are kept as size limited reprs so
+# the buffer does not keep the objects alive
+trace_buffer = collections.deque(maxlen=1000)
+
+# classes which have called Log.trace, and the original functions of classes with wrappers installed
+_log_classes = set()
+_traced_classes = {}
+
+
+# upper bounds of latency histogram buckets in nanoseconds, 10us to 10s
+LATENCY_BUCKETS = [int(scale * 10 ** exponent) for exponent in range(4, 10) for scale in (1, 2.5, 5)] + [10 ** 10]
+
+
+class LatencyStats(object):
+    """ Call count, cumulative time and latency histogram of a traced method """
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def add(self, elapsed: int) -> None:
+        """ Record a call which took elapsed nanoseconds """
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+        self.buckets[bisect.bisect_left(LATENCY_BUCKETS, elapsed)] += 1
+
+    def merge(self, other: 'LatencyStats') -> None:
+        """ Add the calls recorded by other """
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        self.buckets = [count + other_count for count, other_count in zip(self.buckets, other.buckets)]
+
+    def percentile(self, fraction: float) -> float:
+        """ Return the latency in nanoseconds below which the given fraction of calls fall, interpolated within the
+            histogram bucket holding it """
+        target = fraction * self.count
+        cumulative = 0
+        lower = 0
+        for bound, count in zip(LATENCY_BUCKETS, self.buckets):
+            if count and cumulative + count >= target:
+                return min(lower + (bound - lower) * (target - cumulative) / count, self.max)
+            cumulative += count
+            lower = bound
+        return self.max
+
+
+# latency stats keyed by method name, one table per thread so recording needs no lock - merged when read
+_profile_local = threading.local()
+_profile_tables = []
+
+
+def _record_latency(name: str, elapsed: int) -> None:
+    try:
+        table = _profile_local.table
+    except AttributeError:
+        table = _profile_local.table = {}
+        _profile_tables.append(table)
+
+    stats = table.get(name)
+    if stats is None:
+        stats = table[name] = LatencyStats()
+    stats.add(elapsed)
+
+
+def _buffer_call(name: str, args: tuple, kwargs: dict, result) -> None:
+    trace_buffer.append((time.time(), name, reprlib.repr(args), reprlib.repr(kwargs), reprlib.repr(result)))
 
 
 def trace(logger, fn):
-    """ Logging decorator """
+    """ Logging decorator - arguments and results are only formatted if DEBUG is enabled for the logger, and latency is
+        recorded while profiling is enabled """
 
-    @functools.wraps(fn)
-    def wrapper(*args, **kwargs):
-        if not getattr(fn, 'trace', True):
+    name = fn.__qualname__
+
+    def traced(*args, **kwargs):
+        if not _tracing['enabled'] and not logger.isEnabledFor(logging.DEBUG):
             return fn(*args, **kwargs)
 
-        logger.debug('{0}({1}, {2})'.format(fn.__name__, str(args), str(kwargs)))
+        sample_rate = _tracing['sample_rate']
+        if sample_rate < 1.0 and random.random() >= sample_rate:
+            return fn(*args, **kwargs)
+
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug('%s(%r, %r)', fn.__name__, args, kwargs)
         try:
             ret_val = fn(*args, **kwargs)
         except:
-            logger.exception('{0}'.format(fn.__name__), exc_info=True)
+            logger.exception('%s', fn.__name__)
+            _buffer_call(name, args, kwargs, sys.exc_info()[1])
             raise
-        logger.debug('{0}(..) -> {1}'.format(fn.__name__, str(ret_val)))
+        if debug:
+            logger.debug('%s(..) -> %r', fn.__name__, ret_val)
+        _buffer_call(name, args, kwargs, ret_val)
         return ret_val
-    return wrapper
 
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not _tracing['profile']:
+            return traced(*args, **kwargs)
 
+        start = time.perf_counter_ns()
+        try:
+            return traced(*args, **kwargs)
+        finally:
+            _record_latency(name, time.perf_counter_ns() - start)
 
-class Log(object):
-    """ Class decorator which logs calls to all instance methods """
+    wrapper.traced = True
+    return wrapper
 
-    def trace(self):
-        self._logger = logger = logging.getLogger(self.__class__.__name__)
 
-        for attr_name in dir(self):
-            if attr_name in ['self'] or attr_name.startswith('__'):
+def _install(cls) -> None:
+    """ Wrap the methods defined by each class in the class hierarchy, including mixins which are not Log subclasses -
+        each class is only wrapped once """
+    for klass in cls.__mro__:
+        if klass is Log or klass is object or klass in _traced_classes:
+            continue
+
+        logger = logging.getLogger(klass.__name__)
+        originals = _traced_classes[klass] = {}
+        for attr_name, attr in list(vars(klass).items()):
+            if attr_name.startswith('__') or not inspect.isfunction(attr) or hasattr(attr, 'traced'):
+                continue
+            if not getattr(attr, 'trace', True):
                 continue
 
-            attr = getattr(self, attr_name)
+            originals[attr_name] = attr
+            setattr(klass, attr_name, trace(logger, attr))
 
-            # already being traced by super class
-            if hasattr(attr, 'traced'):
-                continue
 
-            if callable(attr) and hasattr(attr, '__func__') and not inspect.isclass(attr):
-                setattr(attr.__func__, 'traced', True)
-                setattr(self, attr_name, trace(logger, attr))
+def enable_tracing(sample_rate: float=1.0, buffer_size: int=None) -> None:
+    """ Trace calls to Log subclasses regardless of logging level
+        Params -
+            sample_rate - fraction of calls to trace
+            buffer_size - number of recent calls to keep in trace_buffer"""
+
+    global trace_buffer
+
+    _tracing['enabled'] = True
+    _tracing['sample_rate'] = sample_rate
+    if buffer_size is not None and buffer_size != trace_buffer.maxlen:
+        trace_buffer = collections.deque(trace_buffer, maxlen=buffer_size)
+
+    for cls in list(_log_classes):
+        _install(cls)
+
+
+def disable_tracing() -> None:
+    """ Stop tracing - wrappers are removed so traced methods are called directly again unless profiling is enabled """
+    _tracing['enabled'] = False
+    _tracing['sample_rate'] = 1.0
+    if not _tracing['profile']:
+        _uninstall()
+
+
+def _uninstall() -> None:
+    for klass, originals in _traced_classes.items():
+        for attr_name, fn in originals.items():
+            setattr(klass, attr_name, fn)
+    _traced_classes.clear()
+
+
+def recent_calls(limit: int=None) -> list:
+    """ Return the most recent traced calls formatted as log lines, oldest first """
+    calls = list(trace_buffer)
+    if limit is not None:
+        calls = calls[-limit:]
+
+    lines = []
+    for called, name, args, kwargs, result in calls:
+        timestamp = time.strftime('%H:%M:%S', time.localtime(called))
+        lines.append('{0} {1}({2}, {3}) -> {4}'.format(timestamp, name, args, kwargs, result))
+    return lines
+
+
+def enable_profiling() -> None:
+    """ Record call counts and latency histograms of methods of Log subclasses """
+    _tracing['profile'] = True
+    for cls in list(_log_classes):
+        _install(cls)
+
+
+def disable_profiling() -> None:
+    """ Stop recording latency - recorded stats are kept until reset_profile() """
+    _tracing['profile'] = False
+    if not _tracing['enabled']:
+        _uninstall()
+
+
+def reset_profile() -> None:
+    """ Discard recorded latency stats """
+    for table in list(_profile_tables):
+        table.clear()
+
+
+def profile_stats() -> dict:
+    """ Return latency stats of each profiled method merged across threads """
+    merged = {}
+    for table in list(_profile_tables):
+        for name, stats in list(table.items()):
+            merged.setdefault(name, LatencyStats()).merge(stats)
+    return merged
+
+
+def profile_snapshot() -> dict:
+    """ Return call count, total, mean, p50, p95, p99 and max latency in seconds of each profiled method """
+    snapshot = {}
+    for name, stats in profile_stats().items():
+        snapshot[name] = {
+            'count': stats.count,
+            'total': stats.total / 1e9,
+            'mean': stats.total / stats.count / 1e9 if stats.count else 0.0,
+            'p50': stats.percentile(0.5) / 1e9,
+            'p95': stats.percentile(0.95) / 1e9,
+            'p99': stats.percentile(0.99) / 1e9,
+            'max': stats.max / 1e9,
+        }
+    return snapshot
+
+
+def profile_json() -> str:
+    """ Return profile_snapshot() as JSON """
+    return json.dumps(profile_snapshot(), indent=2, sort_keys=True)
+
+
+def profile_prometheus(metric: str='traced_method_latency_seconds') -> str:
+    """ Return the profiled methods as a Prometheus text format histogram, with p50, p95 and p99 as a separate gauge """
+    lines = ['# HELP {0} Latency of traced methods'.format(metric), '# TYPE {0} histogram'.format(metric)]
+    quantile_lines = ['# HELP {0}_quantile Latency quantiles of traced methods'.format(metric),
+                      '# TYPE {0}_quantile gauge'.format(metric)]
+
+    for name, stats in sorted(profile_stats().items()):
+        label = 'method="{0}"'.format(name.replace('\\', '\\\\').replace('"', '\\"'))
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+            cumulative += count
+            lines.append('{0}_bucket{{{1},le="{2:g}"}} {3}'.format(metric, label, bound / 1e9, cumulative))
+        lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(metric, label, stats.count))
+        lines.append('{0}_sum{{{1}}} {2:.9f}'.format(metric, label, stats.total / 1e9))
+        lines.append('{0}_count{{{1}}} {2}'.format(metric, label, stats.count))
+
+        for quantile in (0.5, 0.95, 0.99):
+            quantile_lines.append('{0}_quantile{{{1},quantile="{2}"}} {3:.9f}'.format(
+                metric, label, quantile, stats.percentile(quantile) / 1e9))
+
+    return '\n'.join(lines + quantile_lines) + '\n'
+
+
+class Log(object):
+    """ Class decorator which logs calls to all instance methods - methods are wrapped once per class, and only if
+        tracing or profiling is enabled or DEBUG is enabled for the class logger when the first instance is created """
+
+    def trace(self):
+        cls = self.__class__
+        self._logger = logger = logging.getLogger(cls.__name__)
+
+        if cls in _log_classes:
+            return
+        _log_classes.add(cls)
 
+        if _tracing['enabled'] or _tracing['profile'] or logger.isEnabledFor(logging.DEBUG):
+            _install(cls)
@@ -0,0 +1,166 @@
+""" Startup profiler - times each module import and marks such as the first paint of a view
+
+    from [package].utils import startup
+    profiler = startup.StartupProfiler().install()   # before importing Qt or the views
+    ...
+    profiler.watch_first_paint(table_view, callback=lambda name, seconds: print(profiler.report()))
+
+Qt is only imported once a widget is watched so the import of Qt itself is measured.
+"""
+
+import sys
+import json
+import time
+import typing
+import importlib.abc
+
+
+class _TimingLoader(importlib.abc.Loader):
+    """ Loader wrapper timing module creation and execution - everything else is passed to the original loader """
+
+    def __init__(self, loader: importlib.abc.Loader, profiler: 'StartupProfiler') -> None:
+        self.loader = loader
+        self.profiler = profiler
+
+    def create_module(self, spec: typing.Any) -> typing.Any:
+        # extension modules, eg. the PyQt5 modules, are loaded and initialised here rather than in exec_module
+        return self.profiler._time(spec.name, self.loader.create_module, spec)
+
+    def exec_module(self, module: typing.Any) -> None:
+        module.__loader__ = self.loader
+        self.profiler._time(module.__name__, self.loader.exec_module, module)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.loader, name)
+
+
+class _TimingFinder(importlib.abc.MetaPathFinder):
+    """ Meta path finder which finds modules with the finders after it and wraps their loaders """
+
+    def __init__(self, profiler: 'StartupProfiler') -> None:
+        self.profiler = profiler
+
+    def find_spec(self, fullname: str, path: typing.Any, target: typing.Any=None) -> typing.Any:
+        finders = sys.meta_path[sys.meta_path.index(self) + 1:] if self in sys.meta_path else []
+        for finder in finders:
+            find_spec = getattr(finder, 'find_spec', None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                spec.loader = _TimingLoader(spec.loader, self.profiler)
+            return spec
+        return None
+
+
+class StartupProfiler(object):
+    """ Records the time taken to import each module while installed, and named marks measured from when the profiler
+        was created - per module times are cumulative (including the modules it imports) and self (excluding them) """
+
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.modules = {}  # type: typing.Dict[str, typing.List[float]]
+        self.marks = []  # type: typing.List[typing.Tuple[str, float]]
+        self._finder = _TimingFinder(self)
+        self._stack = []  # type: typing.List[float]
+        self._watchers = []
+
+    def install(self) -> 'StartupProfiler':
+        """ Start timing imports - modules already imported are not measured """
+        if self._finder not in sys.meta_path:
+            sys.meta_path.insert(0, self._finder)
+        return self
+
+    def uninstall(self) -> None:
+        """ Stop timing imports """
+        if self._finder in sys.meta_path:
+            sys.meta_path.remove(self._finder)
+
+    def _time(self, name: str, function: typing.Callable, *args: typing.Any) -> typing.Any:
+        start = time.perf_counter()
+        self._stack.append(0.0)
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+
+            times = self.modules.setdefault(name, [0.0, 0.0])
+            times[0] += elapsed
+            times[1] += elapsed - children
+
+    def mark(self, name: str) -> float:
+        """ Record a named point in startup, returning the seconds since the profiler was created """
+        seconds = time.perf_counter() - self.started
+        self.marks.append((name, seconds))
+        return seconds
+
+    def watch_first_paint(self, widget: typing.Any, name: str=None,
+                          callback: typing.Callable[[str, float], None]=None) -> None:
+        """ Mark the first time a widget has painted - for a RecordTableView or other scroll area the table contents
+            are watched rather than the window frame
+            Params -
+                widget - widget to watch
+                name - name of the mark, 'first paint [widget class]' if not given
+                callback - called with the mark name and seconds once the widget has painted"""
+
+        from PyQt5.QtCore import QObject, QEvent, QTimer
+        from PyQt5.QtWidgets import QAbstractScrollArea
+
+        name = name or 'first paint {0}'.format(widget.__class__.__name__)
+        target = getattr(widget, 'table_view', widget)
+        if isinstance(target, QAbstractScrollArea):
+            target = target.viewport()
+
+        profiler = self
+
+        class PaintWatcher(QObject):
+
+            def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+                if event.type() == QEvent.Paint:
+                    watched.removeEventFilter(self)
+                    # the filter sees the event before it is handled - mark once painting has finished
+                    QTimer.singleShot(0, self.painted)
+                return False
+
+            def painted(self) -> None:
+                seconds = profiler.mark(name)
+                profiler._watchers.remove(self)
+                if callback is not None:
+                    callback(name, seconds)
+
+        watcher = PaintWatcher()
+        self._watchers.append(watcher)
+        target.installEventFilter(watcher)
+
+    def snapshot(self) -> dict:
+        """ Return the marks and module import times in seconds, slowest modules first """
+        modules = sorted(self.modules.items(), key=lambda item: item[1][1], reverse=True)
+        return {
+            'marks': [{'name': name, 'seconds': seconds} for name, seconds in self.marks],
+            'import_seconds': sum(times[1] for name, times in modules),
+            'modules': [{'name': name, 'cumulative': times[0], 'self': times[1]} for name, times in modules],
+        }
+
+    def json(self) -> str:
+        """ Return snapshot() as JSON """
+        return json.dumps(self.snapshot(), indent=2)
+
+    def report(self, limit: int=25) -> str:
+        """ Return the marks and slowest imports as text
+            Params -
+                limit - number of modules to list"""
+
+        snapshot = self.snapshot()
+        lines = ['{0:<48} {1:>10.4f}s'.format(mark['name'], mark['seconds']) for mark in snapshot['marks']]
+        lines.append('{0:<48} {1:>10.4f}s ({2} modules)'.format('imports', snapshot['import_seconds'],
+                                                              len(snapshot['modules'])))
+        lines.append('')
+        lines.append('{0:<48} {1:>11} {2:>11}'.format('module', 'self', 'cumulative'))
+        for module in snapshot['modules'][:limit]:
+            lines.append('{0:<48} {1:>10.4f}s {2:>10.4f}s'.format(module['name'], module['self'], module['cumulative']))
+        return '\n'.join(lines)
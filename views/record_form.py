@@ -1,41 +1,127 @@
+import io
+import os
+import re
+import typing
 import inspect
 
-from PyQt5.uic import loadUi
-from PyQt5.QtGui import QIcon
-from PyQt5.QtCore import QModelIndex, pyqtSignal
+from PyQt5.QtCore import QObject, QEvent, QModelIndex, QTimer, pyqtSignal
 from PyQt5.QtWidgets import QMainWindow, QDataWidgetMapper, QVBoxLayout, QMessageBox
-from PyQt5.QtSql import QSqlRecord
+from PyQt5.QtSql import QSqlRecord, QSqlTableModel
 
+from ..assets import icon, register_resources
 from ..exceptions import ImproperlyConfigured
+from ..db.exceptions import SQLError
+from ..db.unit_of_work import UnitOfWork
+from ..db.loader import RowsLoader
+
+
+# compiled designer forms keyed by path - (modification time, form class)
+_ui_classes = {}
+
+# import of a resource module generated by uic for a resource file included by a designer form
+_resource_import = re.compile(r'^import \w+_rc$')
+
+# subview loaders which are still running - kept until they finish even if their form is destroyed
+_running_loaders = set()
+
+
+class _SetupEvent(object):
+    """ Stands in for a form's signal while the form is set up, recording the handlers the form connects so they can
+        be connected again after reset() - not instantiated by user
+        Params -
+            signal - the form's bound signal
+            handlers - list the connected handlers and connection arguments are added to"""
+
+    def __init__(self, signal: typing.Any, handlers: typing.List[typing.Tuple[typing.Callable, tuple]]) -> None:
+        self.signal = signal
+        self.handlers = handlers
+
+    def connect(self, slot: typing.Callable, *args: typing.Any) -> typing.Any:
+        self.handlers.append((slot, args))
+        return self.signal.connect(slot, *args)
+
+    def __getattr__(self, name: str) -> typing.Any:
+        return getattr(self.signal, name)
+
+
+def load_ui_class(path: str) -> type:
+    """ Return the compiled form class for a designer file - the file is only parsed and compiled again if it has been
+        modified since it was last loaded """
+
+    modified = os.path.getmtime(path)
+    cached = _ui_classes.get(path)
+    if cached and cached[0] == modified:
+        return cached[1]
+
+    # uic pulls in the xml parser and code generator - only needed by forms built from designer files
+    from PyQt5.uic.Compiler.compiler import UICompiler
+
+    code = io.StringIO()
+    form_info = UICompiler().compileUi(path, code, False, '_rc', '.')
+
+    # uic imports the pyrcc5 module of each resource file a form includes, which loadUi never did - the icons are
+    # registered by register_resources() instead
+    source = '\n'.join(line for line in code.getvalue().splitlines() if not _resource_import.match(line))
+    form_globals = {}
+    exec(compile(source, path, 'exec'), form_globals)
+
+    form_class = form_globals[form_info['uiclass']]
+    _ui_classes[path] = (modified, form_class)
+    return form_class
 
 
 class RecordFormView(QMainWindow):
     """ Record form view - main view for editing individual records
         Params -
-            ui_file - path to designer file
-            data_model - database model
+            ui_file - path to designer file, compiled once per process and cached
+            ui_class - form class precompiled with pyuic5, used instead of ui_file
+            data_model - database model, switched to OnManualSubmit so edits are written by save_record
             subviews - subviews to insert into this view
                        there must be a QWidget placeholder named [subview_name]_placeholder to insert the subview into
             window_title - obvious
             window_icon - obvious
+            pool_size - number of hidden form windows kept for reuse by acquire()
+            write_behind - queue edits to existing records and commit them in batches on a worker thread, post_save
+                           or save_failed fire once the commit completes
+            async_subviews - load visible subviews after navigation returns to the event loop, reading their rows
+                             concurrently on pooled worker threads which keep their own connections, and
+                             cancelling loads for records that have already been navigated away from
         Events -
             pre_save - fired before saving the record to database
             post_save - fired after saving the record to database
+            save_failed - fired with the error message if a write-behind save could not be committed
+            subview_loaded - fired with the subview name after a subview has been refreshed for the current record
         """
 
     ui_file = ''  # type: str
+    ui_class = None
     data_model = None
     subviews = {}
 
     window_title = None
     window_icon = None
 
+    pool_size = 1
+    write_behind = False
+    async_subviews = False
+
     pre_save = pyqtSignal(QSqlRecord)
     post_save = pyqtSignal()
+    save_failed = pyqtSignal(str)
+    subview_loaded = pyqtSignal(str)
+
+    _events = ('pre_save', 'post_save', 'save_failed', 'subview_loaded')
 
     def __init__(self, model=None, ui_file: str=None) -> None:
         super().__init__()
-        loadUi(ui_file or self.ui_file, self)
+
+        # setup widgets from the compiled form and expose them as attributes as loadUi does
+        form_class = self.ui_class if self.ui_class and not ui_file else load_ui_class(ui_file or self.ui_file)
+        form = form_class()
+        register_resources()
+        form.setupUi(self)
+        for name, value in vars(form).items():
+            setattr(self, name, value)
 
         self.row = None
         self.record = None
@@ -43,12 +129,14 @@ class RecordFormView(QMainWindow):
         self.new_record = False
         self.parent_view = None
         self.sub_views = []
+        self._queued_changes = {}  # type: typing.Dict[typing.Any, typing.Tuple[int, typing.Dict[str, typing.Any]]]
+        self._save_queue = None
 
         if self.window_title:
             self.setWindowTitle(self.window_title)
 
         if self.window_icon:
-            self.setWindowIcon(QIcon(self.window_icon))
+            self.setWindowIcon(icon(self.window_icon))
 
         # allow passing a model class or instances
         model = model or self.model
@@ -57,36 +145,126 @@ class RecordFormView(QMainWindow):
         else:
             self.data_model = model
 
+        # edits stay in the model until save_record commits them, with subview edits, in one unit of work or queues
+        # them for write-behind - Qt's row change and field change strategies would write them on their own. Setting
+        # the strategy reverts unsubmitted changes, so it is only set when it differs
+        if self.data_model.editStrategy() != QSqlTableModel.OnManualSubmit:
+            self.data_model.setEditStrategy(QSqlTableModel.OnManualSubmit)
+
         # update subviews on row change
         self.data_mapper = QDataWidgetMapper()
         self.data_mapper.setModel(self.data_model)
-        self.data_mapper.currentIndexChanged.connect(self._update_subviews)
+        self.data_mapper.currentIndexChanged.connect(self._current_row_changed)
+        self._mapper_row = -1
 
         # auto map fields to db columns
         for field in self.data_model.fields:
             if hasattr(self, field.name):
                 self.data_mapper.addMapping(getattr(self, field.name), field.index)
 
-        # setup subviews
-        for view_name, view_cls in self.subviews.items():
+        # subviews are created and loaded when their placeholder is first shown
+        self._subview_placeholders = {}
+        self._stale_subviews = set()
+        self._related_id = None
+        self._load_generation = 0
+        self._subview_loaders = {}  # type: typing.Dict[str, RowsLoader]
+
+        # visible subviews are loaded once navigation returns to the event loop - the timer is destroyed with the form,
+        # dropping any pending load
+        self._subview_timer = QTimer(self)
+        self._subview_timer.setSingleShot(True)
+        self._subview_timer.timeout.connect(self._load_subviews)
+
+        for view_name in self.subviews:
             placeholder_name = '{0}_placeholder'.format(view_name)
             try:
                 placeholder = getattr(self, placeholder_name)
             except AttributeError:
                 raise ImproperlyConfigured('Unable to find subview placeholder ' + placeholder_name)
 
-            view = view_cls()
-            self.sub_views.append(view)
-            view.set_parent_view(self)
-            layout = placeholder.layout()
-            if not layout:
-                layout = QVBoxLayout(placeholder)
-            layout.setContentsMargins(0, 0, 0, 0)
-            layout.addWidget(view)
-            setattr(self, view_name, view)
+            self._subview_placeholders[view_name] = placeholder
+            placeholder.installEventFilter(self)
 
+        # handlers the form connects to its own events while it is set up are kept by reset()
+        self._own_handlers = {name: [] for name in self._events}
         if hasattr(self, 'setup_ui'):
-            self.setup_ui()
+            for name, handlers in self._own_handlers.items():
+                self.__dict__[name] = _SetupEvent(getattr(self, name), handlers)
+            try:
+                self.setup_ui()
+            finally:
+                for name in self._own_handlers:
+                    del self.__dict__[name]
+
+    @classmethod
+    def acquire(cls, model=None) -> 'RecordFormView':
+        """ Return a hidden form window from the pool, re-pointed at the model rather than rebuilt - a new form is
+            created if none are free """
+
+        pool = cls.__dict__.get('_pool')
+        if pool is None:
+            pool = cls._pool = []
+
+        for form in pool:
+            if form.isHidden() and (model is None or inspect.isclass(model) or form.data_model is model):
+                form.reset()
+                return form
+
+        form = cls(model=model)
+        if len(pool) < cls.pool_size:
+            pool.append(form)
+        return form
+
+    def reset(self) -> None:
+        """ Clear per record state so the form can be reused for another record - handlers connected to the form's
+            events are disconnected so they do not accumulate each time the form is acquired, the handlers the form
+            connected in setup_ui are then connected again """
+        self.row = None
+        self.record = None
+        self.new_record = False
+        self._queued_changes = {}
+        self.set_read_only(False)
+
+        for name, handlers in self._own_handlers.items():
+            signal = getattr(self, name)
+            try:
+                signal.disconnect()
+            except TypeError:
+                # nothing connected
+                pass
+            for slot, args in handlers:
+                signal.connect(slot, *args)
+
+    def __getattr__(self, name: str):
+        # subviews are created on first access
+        if name in self.__dict__.get('_subview_placeholders', {}):
+            return self.get_subview(name)
+        raise AttributeError("'{0}' object has no attribute '{1}'".format(self.__class__.__name__, name))
+
+    def get_subview(self, view_name: str):
+        """ Return subview, creating it in its placeholder if it has not been created yet """
+        view = self.__dict__.get(view_name)
+        if view is not None:
+            return view
+
+        view = self.subviews[view_name]()
+        # subview edits are committed with the record by save_record
+        if getattr(view, 'data_model', None) is not None and \
+                view.data_model.editStrategy() != QSqlTableModel.OnManualSubmit:
+            view.data_model.setEditStrategy(QSqlTableModel.OnManualSubmit)
+        self.sub_views.append(view)
+        view.set_parent_view(self)
+        placeholder = self._subview_placeholders[view_name]
+        layout = placeholder.layout()
+        if not layout:
+            layout = QVBoxLayout(placeholder)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(view)
+        setattr(self, view_name, view)
+
+        if self._related_id is not None:
+            self._stale_subviews.add(view_name)
+        return view
 
     def set_read_only(self, read_only):
         """ Set form as read only """
@@ -112,27 +290,175 @@ class RecordFormView(QMainWindow):
         self.data_mapper.setCurrentModelIndex(model_index)
 
     def save_record(self) -> bool:
-        """ Save active record """
+        """ Save active record and any changes made in its subviews in one transaction """
         index = self.data_mapper.currentIndex()
         record = self.data_mapper.model().record(index)
         self.pre_save.emit(record)
 
-        saved = self.data_model.submitAll()
-        if not saved:
-            QMessageBox.critical(self, 'Save record', 'Unable to save record\n{0}'.format(self.data_model.lastError().text()))
+        if self.write_behind and not self.new_record:
+            self._queue_save(index, record)
+            return True
+
+        # the record and any changes made in its subviews are committed together
+        unit_of_work = UnitOfWork(self.data_model)
+        for view in self.sub_views:
+            if getattr(view, 'data_model', None) is not None:
+                unit_of_work.add(view.data_model)
+
+        try:
+            unit_of_work.commit()
+        except SQLError as error:
+            QMessageBox.critical(self, 'Save record', 'Unable to save record\n{0}'.format(error))
             return False
 
+        # updates are patched rather than re-selected, so re-read the row for values set by defaults or triggers
+        if not self.new_record:
+            self.data_model.selectRow(index)
+
         self.post_save.emit()
         return True
 
+    def _queue_save(self, row: int, record: QSqlRecord) -> None:
+        """ Queue the edited fields of the row on the model's write-behind queue - the edits stay in the model until
+            they have been committed, so they are still unsubmitted edits if the commit fails """
+        changes = self.data_model.row_changes(row)
+        if not changes:
+            self.post_save.emit()
+            return
+
+        if self._save_queue is None:
+            self._save_queue = self.data_model.get_save_queue()
+            self._save_queue.saved.connect(self._queued_save_complete)
+            self._save_queue.failed.connect(self._queued_save_failed)
+
+        id_value = record.value(self.data_model.id_field_name)
+        queued = self._queued_changes.get(id_value, (row, {}))[1]
+        queued.update(changes)
+        self._queued_changes[id_value] = (row, queued)
+        self._save_queue.enqueue(id_value, changes)
+
+    # write-behind commit event handler - committed values replace the edits once every change to the row is written
+    def _queued_save_complete(self, ids: typing.List[typing.Any]) -> None:
+        completed = False
+        for id_value in ids:
+            if id_value not in self._queued_changes or self._save_queue.is_queued(id_value):
+                continue
+
+            row, changes = self._queued_changes.pop(id_value)
+            completed = True
+
+            # the model may have been re-selected since, in which case it already holds the committed values
+            model = self.data_model
+            if row < model.rowCount() and model.primaryValues(row).value(model.id_field_name) == id_value:
+                model.patch_row(row, changes)
+
+        if completed:
+            self.post_save.emit()
+
+    # write-behind failure event handler - the edits are left in the model unsubmitted
+    def _queued_save_failed(self, ids: typing.List[typing.Any], error: str) -> None:
+        failed = [id_value for id_value in ids if self._queued_changes.pop(id_value, None) is not None]
+        if failed:
+            self.save_failed.emit(error)
+
+    def _refresh_subview(self, view_name: str) -> None:
+        """ Load subview records for the current record """
+        model = self.get_subview(view_name).data_model
+        model.set_related_id(self._related_id)
+        model.select()
+        self._stale_subviews.discard(view_name)
+        self.subview_loaded.emit(view_name)
+
+    def _load_subviews(self) -> None:
+        """ Deferred load of the visible stale subviews for the current record """
+        for view_name, placeholder in self._subview_placeholders.items():
+            if view_name in self._stale_subviews and placeholder.isVisible():
+                self._load_subview(view_name)
+
+    def _load_subview(self, view_name: str) -> None:
+        """ Read the subview's rows for the current record on a worker thread - the rows are dropped if the form has
+            moved to another record by the time they have been read """
+        model = self.get_subview(view_name).data_model
+        model.set_related_id(self._related_id)
+
+        previous = self._subview_loaders.get(view_name)
+        if previous is not None:
+            previous.cancel()
+
+        loader = RowsLoader(model.database().connectionName(), model.selectStatement())
+        loader.view_name = view_name
+        loader.generation = self._load_generation
+        loader.loaded.connect(self._subview_rows_loaded)
+        loader.failed.connect(self._subview_rows_failed)
+        loader.finished.connect(lambda: _running_loaders.discard(loader))
+        _running_loaders.add(loader)
+        self._subview_loaders[view_name] = loader
+        loader.start()
+
+    # subview loader completed event handler - hands the rows to the subview's model if they are still wanted
+    def _subview_rows_loaded(self, record: QSqlRecord, rows: typing.List[typing.List[typing.Any]]) -> None:
+        loader = self.sender()
+        if loader.generation != self._load_generation or loader.view_name not in self._stale_subviews:
+            return
+
+        self.get_subview(loader.view_name).data_model.load_rows(record, rows)
+        self._stale_subviews.discard(loader.view_name)
+        self.subview_loaded.emit(loader.view_name)
+
+    # subview loader failure event handler - eg. in memory databases cannot be read from another connection
+    def _subview_rows_failed(self, error: str) -> None:
+        loader = self.sender()
+        if loader.generation == self._load_generation and loader.view_name in self._stale_subviews:
+            self._refresh_subview(loader.view_name)
+
+    # mapper row change event handler - deleted rows stay loaded in the model until it is re-selected, so navigation
+    # moves on to the nearest row which has not been deleted in the same direction
+    def _current_row_changed(self, index: int) -> None:
+        deleted_rows = self.data_model.deleted_rows
+        if index in deleted_rows:
+            following = range(index + 1, self.data_model.rowCount())
+            preceding = range(index - 1, -1, -1)
+            candidates = (following, preceding) if index >= self._mapper_row else (preceding, following)
+            for rows in candidates:
+                row = next((row for row in rows if row not in deleted_rows), None)
+                if row is not None:
+                    self.data_mapper.setCurrentIndex(row)
+                    return
+
+        self._mapper_row = index
+        self._update_subviews(index)
+
     # row change event handler
     def _update_subviews(self, index: int):
         record = self.data_model.record(index)
-        id = record.value(self.data_model.id_field_name)
-
-        # refresh subviews
-        for view_name, view_cls in self.subviews.items():
-            view = getattr(self, view_name)
-            model = view.data_model
-            model.set_related_id(id)
-            model.select()
+        self._related_id = record.value(self.data_model.id_field_name)
+        self._load_generation += 1
+
+        # loads for the previous record are no longer wanted - queued loads are dropped and running loads stop reading
+        for loader in self._subview_loaders.values():
+            loader.cancel()
+        self._subview_loaders = {}
+
+        # refresh visible subviews now, hidden subviews are refreshed when they are shown
+        for view_name, placeholder in self._subview_placeholders.items():
+            if not placeholder.isVisible():
+                self._stale_subviews.add(view_name)
+            elif self.async_subviews:
+                # loads start once input queued behind navigation has been handled, which can supersede them
+                self._stale_subviews.add(view_name)
+                self._subview_timer.start(0)
+            else:
+                self._refresh_subview(view_name)
+
+    # Qt override - placeholder show event handler
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Show:
+            for view_name, placeholder in self._subview_placeholders.items():
+                if placeholder is not watched:
+                    continue
+
+                self.get_subview(view_name)
+                if view_name in self._stale_subviews:
+                    self._refresh_subview(view_name)
+
+        return super().eventFilter(watched, event)
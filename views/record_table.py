@@ -1,11 +1,16 @@
 import typing
 import inspect
 
-from PyQt5.QtCore import Qt, pyqtSignal, QModelIndex, QItemSelection
-from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QAbstractItemView, QHeaderView
-from PyQt5.QtGui import QIcon
-
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QModelIndex, QItemSelection
+from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QAbstractItemView, QMessageBox, QFileDialog, \
+    QProgressDialog
+
+from ..assets import icon
+from ..exceptions import ImproperlyConfigured
+from ..db.exceptions import SQLError
+from ..db.transfer import export_model, import_model
 from .table import TableView
+from .sizing import TableSizer
 from .toolbar.record_toolbar import RecordToolbar
 from .toolbar.filter_toolbar import FilterToolbar
 
@@ -20,9 +25,12 @@ class RecordTableView(QMainWindow):
             show_record_toolbar - show standard record tools (add/edit/remove/etc)
             show_filter_toolbar - show filtering tools
             fitler_fields - fields to filter by - passed ot filter toolbar
+            filter_any_field - add filter option which searches all filter fields at once
             can_create - enable new button (requires show_record_toolbar=true)
             can_edit - enable edit button (requires show_record_toolbar=true)
             can_delete - enable delete button (requires show_record_toolbar=true)
+            can_import - enable import button (requires show_record_toolbar=true)
+            can_export - enable export button (requires show_record_toolbar=true)
             read_only_table - denotes whether the table cells can be directly edited (default false)
             read_only_form - set form to read only
             row_select - set table cell select mode to select whole row (default true)
@@ -46,9 +54,12 @@ class RecordTableView(QMainWindow):
     show_record_toolbar = True
     show_filter_toolbar = True
     filter_fields = []
+    filter_any_field = False
     can_create = True
     can_edit = True
     can_delete = True
+    can_import = True
+    can_export = True
     read_only_table = True
     read_only_form = False
     row_select = True
@@ -70,11 +81,14 @@ class RecordTableView(QMainWindow):
 
         self.parent_view = None
 
+        # import and export workers which are still running - several may run at once
+        self.transfer_workers = []
+
         if self.window_title:
             self.setWindowTitle(self.window_title)
 
         if self.window_icon:
-            self.setWindowIcon(QIcon(self.window_icon))
+            self.setWindowIcon(icon(self.window_icon))
 
         # allow passing a model class or instances
         if model:
@@ -110,14 +124,10 @@ class RecordTableView(QMainWindow):
 
         if self.word_wrap:
             self.table_view.setWordWrap(True)
-            self.table_view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
 
-            if not self.wrap_columns:
-                self.table_view.resizeColumnsToContents()
-            else:
-                for column_name in self.wrap_columns:
-                    column = getattr(self.table_view, column_name)
-                    self.table_view.resizeColumnToContents(column.field.index)
+            # size from a sample of rows and only measure visible row heights
+            columns = [getattr(self.table_view, column_name).field.index for column_name in self.wrap_columns]
+            self.table_sizer = TableSizer(self.table_view, columns)
 
         if self.dbl_click_edit and not self.inline_form:
             self.table_view.doubleClicked.connect(self.edit_record)
@@ -137,16 +147,21 @@ class RecordTableView(QMainWindow):
             self.record_toolbar.add_record.setEnabled(self.can_create)
             self.record_toolbar.edit_record.setEnabled(self.can_edit)
             self.record_toolbar.delete_record.setEnabled(self.can_delete)
+            self.record_toolbar.import_records.setEnabled(self.can_import)
+            self.record_toolbar.export_records.setEnabled(self.can_export)
             self.addToolBar(Qt.TopToolBarArea, self.record_toolbar)
 
             self.record_toolbar.add_record.triggered.connect(lambda checked: self.new_record())
             self.record_toolbar.edit_record.triggered.connect(lambda checked: self.edit_record())
-            # delete buttom
+            self.record_toolbar.delete_record.triggered.connect(lambda checked: self.delete_selected_records())
             self.record_toolbar.refresh.triggered.connect(lambda: self.table_view.data_model.select())
+            self.record_toolbar.import_records.triggered.connect(lambda checked: self.import_records())
+            self.record_toolbar.export_records.triggered.connect(lambda checked: self.export_records())
 
         # -- FILTER TOOLBAR
         if self.show_filter_toolbar and self.filter_fields:
-            self.filter_toolbar = FilterToolbar(self.filter_fields, self.table_view.proxy_model)
+            self.filter_toolbar = FilterToolbar(self.filter_fields, self.table_view.proxy_model,
+                                                any_field=self.filter_any_field)
             self.addToolBar(Qt.TopToolBarArea, self.filter_toolbar)
 
         self.addToolBarBreak(Qt.TopToolBarArea)
@@ -163,13 +178,14 @@ class RecordTableView(QMainWindow):
 
     def new_record(self) -> None:
         """ Create new record and set editing mode"""
-        model = self.table_view.data_model
-        record, model_index = model.add_record()
-
+        # the form is acquired first - a new form switches the model to manual submit, which reverts unsubmitted rows
         if not self.inline_form:
-            self.record_form_view = self.form_view(model=self.data_model)
+            self.record_form_view = self.form_view.acquire(model=self.data_model)
             self.record_form_view.set_parent_view(self.parent_view)
 
+        model = self.table_view.data_model
+        record, model_index = model.add_record()
+
         self.record_form_view.new_record = True
         self.record_form_view.set_record_index(model_index)
         self.record_form_view.show()
@@ -185,7 +201,7 @@ class RecordTableView(QMainWindow):
     def edit_record(self, *args: typing.List[typing.Any], **kwargs: typing.Mapping) -> None:
         """ Edit currently active record """
         model_index = self.table_view.get_selected_index()
-        self.record_form_view = self.form_view(model=self.table_view.data_model)
+        self.record_form_view = self.form_view.acquire(model=self.table_view.data_model)
         self.record_form_view.set_record_index(model_index)
         self.record_form_view.show()
 
@@ -193,12 +209,91 @@ class RecordTableView(QMainWindow):
             self.record_form_view.set_read_only(True)
 
     def delete_selected_records(self, *args: typing.List[typing.Any], **kwargs: typing.Mapping) -> None:
-        """ Delete all selected records """
-        model_indexes = self.table_view.get_selected_indexes()
-        for index in model_indexes:
-            self.data_model.removeRow(index.row())
+        """ Delete all selected records in bulk - deleted rows are filtered out rather than reloading the table """
+        rows = self.table_view.get_selected_source_rows()
+        if not rows:
+            return
+
+        try:
+            self.data_model.delete_rows(rows)
+        except SQLError as error:
+            QMessageBox.critical(self, 'Delete records', 'Unable to delete records\n{0}'.format(error))
+            return
+
+        self.after_record_deleted.emit()
+
+    def import_records(self, path: str=None, import_format: str=None, mapping: typing.Dict[str, str]=None,
+                       encoding: str='utf-8') -> None:
+        """ Import records from CSV or JSON Lines on a worker thread with progress and cancellation - the table is
+            refreshed when the import completes """
+        if not path:
+            formats = {'CSV (*.csv)': 'csv', 'JSON Lines (*.jsonl)': 'jsonl'}
+            path, selected_format = QFileDialog.getOpenFileName(self, 'Import records', '', ';;'.join(formats))
+            if not path:
+                return
+            import_format = formats.get(selected_format)
+
+        try:
+            worker = import_model(self.data_model, path, import_format, mapping, encoding=encoding)
+        except ImproperlyConfigured as error:
+            QMessageBox.critical(self, 'Import records', 'Unable to import records\n{0}'.format(error))
+            return
+
+        progress = QProgressDialog('Importing records', 'Cancel', 0, 0, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.canceled.connect(worker.cancel)
+        worker.progress.connect(lambda count: progress.setLabelText('Imported {0} records'.format(count)))
+        worker.failed.connect(
+            lambda error: QMessageBox.critical(self, 'Import records', 'Unable to import records\n{0}'.format(error)))
+        worker.imported.connect(lambda inserted, rejected: self._records_imported(worker, inserted, rejected))
+        worker.finished.connect(progress.close)
+        self._start_worker(worker)
+
+    # import completed event handler
+    def _records_imported(self, worker, inserted: int, rejected: int) -> None:
         self.data_model.select()
 
+        message = 'Imported {0} records'.format(inserted)
+        if rejected:
+            errors = ['Line {0}: {1}'.format(line_number, error)
+                      for line_number, row, error in worker.rejected_rows[:10]]
+            message += '\n{0} records could not be imported\n\n{1}'.format(rejected, '\n'.join(errors))
+            QMessageBox.warning(self, 'Import records', message)
+        else:
+            QMessageBox.information(self, 'Import records', message)
+
+    def export_records(self, path: str=None, export_format: str=None) -> None:
+        """ Export visible records to CSV, JSON Lines or Parquet on a worker thread with progress and cancellation """
+        if not path:
+            formats = {'CSV (*.csv)': 'csv', 'JSON Lines (*.jsonl)': 'jsonl', 'Parquet (*.parquet)': 'parquet'}
+            path, selected_format = QFileDialog.getSaveFileName(self, 'Export records', '', ';;'.join(formats))
+            if not path:
+                return
+            export_format = formats.get(selected_format)
+
+        try:
+            worker = export_model(self.table_view.proxy_model, path, export_format)
+        except ImproperlyConfigured as error:
+            QMessageBox.critical(self, 'Export records', 'Unable to export records\n{0}'.format(error))
+            return
+
+        progress = QProgressDialog('Exporting records', 'Cancel', 0, worker.row_count or 0, self)
+        progress.setWindowModality(Qt.WindowModal)
+        progress.canceled.connect(worker.cancel)
+        worker.progress.connect(progress.setValue)
+        worker.failed.connect(
+            lambda error: QMessageBox.critical(self, 'Export records', 'Unable to export records\n{0}'.format(error)))
+        worker.exported.connect(
+            lambda count: QMessageBox.information(self, 'Export records', 'Exported {0} records'.format(count)))
+        worker.finished.connect(progress.close)
+        self._start_worker(worker)
+
+    def _start_worker(self, worker: QThread) -> None:
+        """ Start a transfer worker, keeping a reference to it until it has finished """
+        self.transfer_workers.append(worker)
+        worker.finished.connect(lambda: self.transfer_workers.remove(worker))
+        worker.start()
+
     # row change event handler to update inline form
     def select_record(self, selected: QItemSelection, deselected: QItemSelection) -> None:
         if self.inline_form:
@@ -1,8 +1,9 @@
-from PyQt5.QtWidgets import *
-from PyQt5.QtGui import QIcon
+from PyQt5.QtWidgets import QMainWindow, QToolBar, QDialog, QFileDialog, QMessageBox
 from PyQt5.QtCore import Qt, QUrl
-from PyQt5.QtWebKitWidgets import QWebView
-from PyQt5.QtPrintSupport import *
+
+from ..assets import icon
+
+# QtWebKitWidgets and QtPrintSupport are slow to load and rarely used - they are imported when a report is opened
 
 
 class ReportViewer(QMainWindow):
@@ -10,21 +11,22 @@ class ReportViewer(QMainWindow):
         DEPRECATED - PyQt5 has deprecated QtWebView"""
 
     def __init__(self, title):
+        from PyQt5.QtWebKitWidgets import QWebView
+
         super().__init__()
 
         self.setWindowTitle('Report Viewer - ' + title)
-        self.setWindowIcon(QIcon(':icon/report.png'))
 
         self.report = QWebView()
         self.setCentralWidget(self.report)
 
-        self.setWindowIcon(QIcon(':report/report'))
+        self.setWindowIcon(icon(':report/report'))
 
         self.actionToolbar = QToolBar('Actions')
-        self.actionToolbar.addAction(QIcon(':report/print'), 'Print Report', self.print)
-        self.actionToolbar.addAction(QIcon(':report/pdf'), 'PDF Report', self.pdf)
+        self.actionToolbar.addAction(icon(':report/print'), 'Print Report', self.print)
+        self.actionToolbar.addAction(icon(':report/pdf'), 'PDF Report', self.pdf)
         self.actionToolbar.addSeparator()
-        self.actionToolbar.addAction(QIcon(':record/refresh'), 'Refresh', self.report.reload)
+        self.actionToolbar.addAction(icon(':record/refresh'), 'Refresh', self.report.reload)
         self.addToolBar(Qt.TopToolBarArea, self.actionToolbar)
 
         raise DeprecationWarning('Qt5 has deprecated QWebView')
@@ -35,6 +37,8 @@ class ReportViewer(QMainWindow):
 
     def print(self):
         """ Print report to selected printer """
+        from PyQt5.QtPrintSupport import QPrinter, QPrintDialog
+
         printer = QPrinter()
         dialog = QPrintDialog(printer)
         dialog.setWindowTitle("Print Document")
@@ -48,6 +52,8 @@ class ReportViewer(QMainWindow):
         if not filename:
             return
 
+        from PyQt5.QtPrintSupport import QPrinter
+
         printer = QPrinter(QPrinter.HighResolution)
         printer.setOutputFileName(filename[0])
         printer.setOutputFormat(QPrinter.PdfFormat)
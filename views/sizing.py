@@ -0,0 +1,146 @@
+import typing
+
+from PyQt5.QtCore import Qt, QObject, QModelIndex, QTimer, QEvent, QRect, QSize
+from PyQt5.QtWidgets import QTableView, QHeaderView
+
+
+class TableSizer(QObject):
+    """ Sizes the columns and rows of word wrapped table views without measuring every row - column widths are
+        estimated from a sample of rows and row heights are only measured for visible rows, cached by row content
+        Params -
+            table - table view to size
+            columns - logical indexes of columns to fit to their contents, all columns if empty
+            sample_size - number of rows sampled when estimating column widths
+            cache_size - maximum number of cached row heights"""
+
+    sample_size = 200
+    cache_size = 10000
+
+    def __init__(self, table: QTableView, columns: typing.List[int]=None, sample_size: int=None) -> None:
+        super().__init__(table)
+
+        self.table = table
+        self.columns = columns or []
+        if sample_size:
+            self.sample_size = sample_size
+
+        self.row_heights = {}  # type: typing.Dict[tuple, int]
+        self.measured_rows = set()  # type: typing.Set[int]
+        self.columns_sized = False
+
+        # heights are set by the sizer rather than Qt measuring every row on each layout pass
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Interactive)
+
+        # coalesce updates into one pass per event loop iteration
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.update_rows)
+
+        model = table.model()
+        model.modelReset.connect(self.invalidate)
+        model.layoutChanged.connect(self.invalidate)
+        model.rowsInserted.connect(self.invalidate)
+        model.rowsRemoved.connect(self.invalidate)
+        model.dataChanged.connect(self._data_changed)
+        table.verticalScrollBar().valueChanged.connect(self._schedule)
+        table.horizontalHeader().sectionResized.connect(self._column_resized)
+        table.viewport().installEventFilter(self)
+
+        self.invalidate()
+
+    # Qt override - more rows may become visible when the table is resized
+    def eventFilter(self, watched: QObject, event: QEvent) -> bool:
+        if event.type() == QEvent.Resize:
+            self._schedule()
+        return False
+
+    def _schedule(self, *args: typing.List[typing.Any]) -> None:
+        self._timer.start(0)
+
+    def invalidate(self, *args: typing.List[typing.Any]) -> None:
+        """ Forget which rows have been measured - cached heights are kept as they are keyed by content """
+        self.measured_rows = set()
+        self._schedule()
+
+    def resize_columns(self) -> None:
+        """ Fit columns to the widest of a sample of rows spread evenly through the model """
+        model = self.table.model()
+        row_count = model.rowCount()
+        step = max(1, row_count // self.sample_size)
+        rows = range(0, row_count, step)
+
+        header = self.table.horizontalHeader()
+        columns = self.columns or range(model.columnCount())
+        for column in columns:
+            if self.table.isColumnHidden(column):
+                continue
+
+            width = header.sectionSizeHint(column)
+            for row in rows:
+                index = model.index(row, column)
+                width = max(width, self._size_hint(index, None).width())
+            self.table.setColumnWidth(column, width)
+
+    def _size_hint(self, index: QModelIndex, width: typing.Optional[int]) -> QSize:
+        option = self.table.viewOptions()
+        if width is not None:
+            # word wrapped text is measured against the column width
+            option.rect = QRect(0, 0, width, self.table.verticalHeader().defaultSectionSize())
+        return self.table.itemDelegate(index).sizeHint(option, index)
+
+    def row_height(self, row: int) -> int:
+        """ Return the height of the given row, measuring it only if a row with the same content and column widths has
+            not been measured before """
+
+        model = self.table.model()
+        columns = [column for column in range(model.columnCount()) if not self.table.isColumnHidden(column)]
+        widths = tuple(self.table.columnWidth(column) for column in columns)
+        indexes = [model.index(row, column) for column in columns]
+        key = (widths, tuple(index.data(Qt.DisplayRole) for index in indexes))
+
+        height = self.row_heights.get(key)
+        if height is None:
+            height = self.table.verticalHeader().minimumSectionSize()
+            for index, width in zip(indexes, widths):
+                height = max(height, self._size_hint(index, width).height())
+            if self.table.showGrid():
+                height += 1
+
+            if len(self.row_heights) >= self.cache_size:
+                self.row_heights = {}
+            self.row_heights[key] = height
+
+        return height
+
+    def update_rows(self) -> None:
+        """ Size rows which are visible and have not been measured since they changed """
+        model = self.table.model()
+        row_count = model.rowCount()
+        if not row_count:
+            return
+
+        if not self.columns_sized:
+            self.resize_columns()
+            self.columns_sized = True
+
+        first = max(self.table.rowAt(0), 0)
+        viewport_height = self.table.viewport().height()
+
+        # walk down from the first visible row until the viewport is filled
+        row = first
+        used = 0
+        while row < row_count and used < viewport_height:
+            if row not in self.measured_rows and not self.table.isRowHidden(row):
+                self.table.setRowHeight(row, self.row_height(row))
+                self.measured_rows.add(row)
+            used += self.table.rowHeight(row)
+            row += 1
+
+    # model data changed event handler
+    def _data_changed(self, top_left: QModelIndex, bottom_right: QModelIndex, roles: typing.List[int]=None) -> None:
+        self.measured_rows.difference_update(range(top_left.row(), bottom_right.row() + 1))
+        self._schedule()
+
+    # column resize event handler
+    def _column_resized(self, column: int, old_size: int, new_size: int) -> None:
+        self.invalidate()
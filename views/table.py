@@ -1,7 +1,8 @@
 import typing
 
-from PyQt5.QtCore import QModelIndex, QObject
-from PyQt5.QtWidgets import QTableView
+from PyQt5.QtCore import Qt, QModelIndex, QObject, QSize
+from PyQt5.QtWidgets import QTableView, QStyle
+from PyQt5.QtSql import QSqlRecord
 
 from ..db import proxy, model
 
@@ -59,6 +60,7 @@ class TableView(QTableView):
         self.proxy_model.setSourceModel(model)
 
         self.setModel(self.proxy_model)
+        self._update_field_icons()
 
         self.columns = []  # type: typing.List[TableColumn]
         for field in self.data_model.fields:
@@ -66,6 +68,21 @@ class TableView(QTableView):
             self.columns.append(column)
             setattr(self, field.name, column)
 
+    # Qt override - fields pre-render their icons at the new size
+    def setIconSize(self, size: QSize) -> None:
+        super().setIconSize(size)
+        self._update_field_icons()
+
+    def _update_field_icons(self) -> None:
+        """ Pass the size icons are drawn at to the fields - the style's small icon size unless one has been set """
+        size = self.iconSize()
+        if not size.isValid():
+            extent = self.style().pixelMetric(QStyle.PM_SmallIconSize, None, self)
+            size = QSize(extent, extent)
+
+        for field in self.data_model.fields:
+            field.set_icon_size(size)
+
     def get_selected_rows(self) -> typing.List[QModelIndex]:
         """ Get list of selected row indexes mapped to logical data model """
         return [self.proxy_model.mapToSource(index) for index in self.selectionModel().selectedRows(0)]
@@ -80,15 +97,38 @@ class TableView(QTableView):
         indexes = self.selectedIndexes()
         return self.proxy_model.mapToSource(indexes[0]) if indexes else None
 
-    def get_selected_records(self) -> None:
+    def get_selected_source_rows(self) -> typing.List[int]:
+        """ Get sorted list of unique selected rows of the logical data model - maps whole selection ranges one row at
+            a time rather than every selected cell """
+
+        # QSortFilterProxyModel.mapSelectionToSource merges one range per row when sorted, which is far slower
+        proxy_model = self.proxy_model
+        rows = set()
+        for selection_range in self.selectionModel().selection():
+            rows.update(proxy_model.mapToSource(proxy_model.index(row, 0)).row()
+                        for row in range(selection_range.top(), selection_range.bottom() + 1))
+        return sorted(rows)
+
+    def iter_selected_records(self) -> typing.Iterator[QSqlRecord]:
+        """ Lazily yield selected records """
+        for row in self.get_selected_source_rows():
+            yield self.data_model.record(row)
+
+    def iter_selected_ids(self) -> typing.Iterator[typing.Any]:
+        """ Lazily yield primary keys of selected records """
+        id_column = self.data_model.fieldIndex(self.data_model.id_field_name)
+        for row in self.get_selected_source_rows():
+            yield self.data_model.data(self.data_model.index(row, id_column), Qt.EditRole)
+
+    def iter_selected_values(self, *fields: str) -> typing.Iterator[typing.Tuple]:
+        """ Lazily yield tuples of the given field values of selected records """
+        columns = [getattr(self, field).field.index for field in fields]
+        for row in self.get_selected_source_rows():
+            yield tuple(self.data_model.data(self.data_model.index(row, column), Qt.EditRole) for column in columns)
+
+    def get_selected_records(self) -> typing.List[QSqlRecord]:
         """ Get list of selected records """
-        indexes = self.get_selected_indexes()
-        records = []
-        for index in indexes:
-            record = self.data_model.record(index.row())
-            if record not in records:
-                records.append(record)
-        return records
+        return list(self.iter_selected_records())
 
     def stretch_last_column(self, stretch: bool) -> None:
         """ Stretch last column to fill available space """
@@ -1,40 +1,44 @@
 import re
 import typing
-import functools
-import fnmatch
+import datetime
 import operator
 
-from PyQt5.QtCore import Qt
-from PyQt5.QtGui import QIcon
+from PyQt5.QtCore import Qt, QDate, QDateTime
+from PyQt5.QtGui import QDoubleValidator
 from PyQt5.QtSql import QSqlRecord
-from PyQt5.QtWidgets import QToolBar, QLineEdit, QComboBox, QCheckBox
+from PyQt5.QtWidgets import QToolBar, QLineEdit, QComboBox, QCheckBox, QDateEdit, QLabel
 
+from ...assets import icon
 from ...db.proxy import CustomSortFilterProxyModel
+from ...db.index import SearchIndex, BitmapIndex, SortedIndex, Bitmap
 
 
 class FilterToolbar(QToolBar):
     """ Toolbar which provides filtering functionality to table views
         Params -
             filter_fields - list of fields to enable filtering on, can be string or dict
-            model - database filtering proxy model"""
+            model - database filtering proxy model
+            any_field - add an option which searches all filter fields at once using a search index"""
 
-    def __init__(self, filter_fields: typing.List[str], model: CustomSortFilterProxyModel) -> None:
+    any_field_caption = 'Any Field'
+
+    def __init__(self, filter_fields: typing.List[str], model: CustomSortFilterProxyModel,
+                 any_field: bool=False) -> None:
         super().__init__('Filter')
 
         self.setObjectName('filter-toolbar')
 
         self.model = model
+        self.search_index = None
 
         # setup ui
         self.filter = QLineEdit()
         self.filter.setMaximumWidth(200)
         self.filter.setPlaceholderText('Filter')
-        self.filter.textChanged.connect(lambda text: self.model.set_filter_string(text))
+        self.filter.textChanged.connect(self._update_filter)
         self.addWidget(self.filter)
 
         self.filter_field = QComboBox()
-        self.filter_field.currentTextChanged.connect(
-            lambda text: self.model.add_filter_function('filter', self.filters[text]['callback']))
 
         self.filters = {}
 
@@ -52,6 +56,9 @@ class FilterToolbar(QToolBar):
             return callback
 
         # setup filters
+        if any_field:
+            self.filter_field.addItem(self.any_field_caption)
+
         for field_definition in filter_fields:
             if type(field_definition) is str:
                 caption = field_definition.replace('_', ' ').title()
@@ -70,18 +77,57 @@ class FilterToolbar(QToolBar):
                 }
                 self.filter_field.addItem(caption)
 
+        # search index over all plain field filters - custom callbacks are not consulted
+        if any_field:
+            fields = [definition['field'] for definition in self.filters.values()]
+            self.search_index = SearchIndex(self.model.sourceModel(), fields)
+            # the proxy refilters the changed rows itself once the index has been updated
+            self.search_index.index_changed.connect(lambda: self._update_search(invalidate=False))
+
         # load filter for default item
-        filter_function = self.filters[self.filter_field.currentText()]['callback']
-        self.model.add_filter_function('filter', filter_function)
+        self._set_filter_field(self.filter_field.currentText())
+        self.filter_field.currentTextChanged.connect(self._set_filter_field)
 
         self.addWidget(self.filter_field)
 
-        self.clear_filter = self.addAction(QIcon(':filter/clear'), 'Clear filter')
+        self.clear_filter = self.addAction(icon(':filter/clear'), 'Clear filter')
         self.clear_filter.triggered.connect(lambda checked: self.filter.setText(''))
 
+    def searching_any_field(self) -> bool:
+        """ Whether the any field option is selected """
+        return self.search_index is not None and self.filter_field.currentText() == self.any_field_caption
+
+    # filter field change event handler
+    def _set_filter_field(self, caption: str) -> None:
+        if caption == self.any_field_caption and self.search_index is not None:
+            self.model.remove_filter_function('filter')
+            self._update_search()
+        else:
+            self.model.set_row_filter('filter', None, invalidate=False)
+            self.model.add_filter_function('filter', self.filters[caption]['callback'])
+
+    # filter text change event handler
+    def _update_filter(self, text: str) -> None:
+        if self.searching_any_field():
+            self._update_search(invalidate=False)
+        self.model.set_filter_string(text)
+
+    # search index change event handler
+    def _update_search(self, invalidate: bool=True) -> None:
+        if not self.searching_any_field():
+            return
+
+        text = self.filter.text()
+        if not text:
+            self.model.set_row_filter('filter', None, invalidate)
+            return
+        self.model.set_row_filter('filter', self.search_index.search(text), invalidate,
+                                  self.search_index.record_filter(text))
+
 
 class BooleanFilterToolbar(QToolBar):
-    """ Toolbar which provides boolean filtering functionality to table views
+    """ Toolbar which provides boolean filtering functionality to table views - each field is backed by a bitmap
+        index so toggles are combined with a bitmap AND and each checkbox shows a live count of the rows it keeps
         Params -
             fields - list of fields to filter by - str or dict"""
 
@@ -93,6 +139,9 @@ class BooleanFilterToolbar(QToolBar):
         self.setObjectName('boolean-filter-toolbar')
         self.model = model
 
+        self.filter_name = 'boolean-filter-{0}'.format(id(self))
+        self.filters = {}
+
         for field in self.fields:
             if type(field) is str:
                 caption = field.replace('_', ' ').title()
@@ -105,14 +154,193 @@ class BooleanFilterToolbar(QToolBar):
                 default = field.get('default', False)
                 op = field.get('op', operator.eq)
 
-                widget = QCheckBox(caption)
-                self.addWidget(widget)
-                widget.stateChanged.connect(functools.partial(self._update_filter, field_name, op))
-                self.update_filter(field_name, op, default)
-                widget.setChecked(default)
+            widget = QCheckBox(caption)
+            widget.setChecked(default)
+            self.addWidget(widget)
+
+            index = BitmapIndex(self.model.sourceModel(), field_name)
+            index.index_changed.connect(lambda: self._update_filter(invalidate=False))
+
+            self.filters[field_name] = {
+                'caption': caption,
+                'op': op,
+                'widget': widget,
+                'index': index
+            }
+
+            widget.stateChanged.connect(self._update_filter)
+
+        self._update_filter()
+
+    def _field_rows(self, field_name: str, state: bool) -> Bitmap:
+        """ Rows kept by the given field's filter in the given state """
+        definition = self.filters[field_name]
+        return definition['index'].rows(state, definition['op'])
+
+    def _field_record_filter(self, field_name: str, state: bool) -> typing.Callable[[QSqlRecord], bool]:
+        """ Record test equivalent to the given field's filter in the given state """
+        definition = self.filters[field_name]
+        return definition['index'].record_filter(state, definition['op'])
+
+    # event listener for checkbox state change and index updates - the proxy refilters rows changed in the index itself
+    def _update_filter(self, *args: typing.List[typing.Any], invalidate: bool=True) -> None:
+        if not self.filters:
+            return
+
+        states = {field_name: definition['widget'].isChecked() for field_name, definition in self.filters.items()}
+        kept = {field_name: self._field_rows(field_name, state) for field_name, state in states.items()}
+
+        # faceted counts - rows kept by each checkbox when checked, combined with the other filters
+        for field_name, definition in self.filters.items():
+            rows = self._field_rows(field_name, True)
+            for other_name, other_rows in kept.items():
+                if other_name != field_name:
+                    rows = rows & other_rows
+            definition['widget'].setText('{0} ({1})'.format(definition['caption'], len(rows)))
+
+        accepted = None
+        for rows in kept.values():
+            accepted = rows if accepted is None else accepted & rows
+        record_filters = [self._field_record_filter(field_name, state) for field_name, state in states.items()]
+        self.model.set_row_filter(self.filter_name, accepted, invalidate, _all_of(record_filters))
+
+
+def _all_of(tests: typing.List[typing.Callable[[QSqlRecord], bool]]) -> typing.Callable[[QSqlRecord], bool]:
+    """ Combine record tests into one which accepts records accepted by every test """
+    return lambda record: all(test(record) for test in tests)
+
+
+# leading date of ISO formatted date and datetime strings
+_iso_date = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+
+def _number_key(value: typing.Any) -> typing.Optional[float]:
+    """ Sort key for numeric fields - values which are not numbers are not indexed """
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _date_key(value: typing.Any) -> typing.Optional[str]:
+    """ Sort key for date fields - values from any driver are reduced to their ISO formatted date, so date and datetime
+        values on the day of an inclusive bound are within it """
+    if isinstance(value, QDateTime):
+        value = value.date()
+    if isinstance(value, QDate):
+        return value.toString(Qt.ISODate) if value.isValid() else None
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+
+    text = str(value)
+    match = _iso_date.match(text)
+    return match.group(0) if match else text or None
+
+
+class RangeFilterToolbar(QToolBar):
+    """ Toolbar which provides range filtering on numeric and date fields to table views - each field is backed by a
+        sorted index so ranges are found by bisection rather than by checking every row
+        Params -
+            fields - list of fields to filter by - str or dict with field, caption and type ('number' or 'date')"""
+
+    fields = []
+
+    def __init__(self, model: CustomSortFilterProxyModel) -> None:
+        super().__init__('Range filter')
+
+        self.setObjectName('range-filter-toolbar')
+        self.model = model
+
+        self.filter_name = 'range-filter-{0}'.format(id(self))
+        self.filters = {}
+
+        for field in self.fields:
+            if type(field) is str:
+                caption = field.replace('_', ' ').title()
+                field_name = field
+                field_type = 'number'
+            else:
+                caption = field.get('caption', field['field'].replace('_', ' ').title())
+                field_name = field['field']
+                field_type = field.get('type', 'number')
+
+            self.addWidget(QLabel(caption))
+
+            if field_type == 'date':
+                low, high = self._date_edit('From'), self._date_edit('To')
+                key = _date_key
+            else:
+                low, high = self._number_edit('From'), self._number_edit('To')
+                key = _number_key
+
+            index = SortedIndex(self.model.sourceModel(), field_name, key)
+            index.index_changed.connect(lambda: self._update_filter(invalidate=False))
+
+            self.filters[field_name] = {
+                'caption': caption,
+                'low': low,
+                'high': high,
+                'index': index
+            }
+
+        self.clear_filter = self.addAction(icon(':filter/clear'), 'Clear filter')
+        self.clear_filter.triggered.connect(lambda checked: self.clear())
+
+    def _number_edit(self, placeholder: str) -> QLineEdit:
+        widget = QLineEdit()
+        widget.setMaximumWidth(80)
+        widget.setPlaceholderText(placeholder)
+        widget.setValidator(QDoubleValidator())
+        widget.textChanged.connect(self._update_filter)
+        self.addWidget(widget)
+        return widget
+
+    def _date_edit(self, placeholder: str) -> QDateEdit:
+        # the minimum date is displayed blank and means no bound
+        widget = QDateEdit()
+        widget.setCalendarPopup(True)
+        widget.setSpecialValueText(placeholder)
+        widget.setDate(widget.minimumDate())
+        widget.dateChanged.connect(self._update_filter)
+        self.addWidget(widget)
+        return widget
+
+    def bound_value(self, widget: typing.Union[QLineEdit, QDateEdit]) -> typing.Any:
+        """ Return the index key of a bound widget's value, or None if the bound is not set - numbers are parsed in
+            the validator's locale so they are read as they were accepted """
+        if isinstance(widget, QDateEdit):
+            return None if widget.date() == widget.minimumDate() else _date_key(widget.date())
+
+        value, valid = widget.validator().locale().toDouble(widget.text())
+        return value if valid else None
+
+    def clear_bound(self, widget: typing.Union[QLineEdit, QDateEdit]) -> None:
+        """ Remove the bound set in a bound widget """
+        if isinstance(widget, QDateEdit):
+            widget.setDate(widget.minimumDate())
+        else:
+            widget.clear()
+
+    def clear(self) -> None:
+        """ Remove all range bounds """
+        for definition in self.filters.values():
+            self.clear_bound(definition['low'])
+            self.clear_bound(definition['high'])
 
-    # event listener for checkbox state change
-    def _update_filter(self, field: str, op: typing.Callable[[typing.Any, typing.Any], bool], state:bool):
-        self.model.set_boolean_filter(field, state, op)
+    # event listener for bound changes and index updates - the proxy refilters rows changed in the index itself
+    def _update_filter(self, *args: typing.List[typing.Any], invalidate: bool=True) -> None:
+        accepted = None
+        record_filters = []
+        for definition in self.filters.values():
+            low = self.bound_value(definition['low'])
+            high = self.bound_value(definition['high'])
+            if low is None and high is None:
+                continue
 
+            rows = definition['index'].between(low, high)
+            accepted = rows if accepted is None else accepted & rows
+            record_filters.append(definition['index'].record_filter(low, high))
 
+        self.model.set_row_filter(self.filter_name, accepted, invalidate, _all_of(record_filters))
@@ -1,6 +1,7 @@
-from PyQt5.QtGui import QIcon
 from PyQt5.QtWidgets import QToolBar
 
+from ...assets import icon
+
 
 class RecordToolbar(QToolBar):
     """ Toolbar for standard record functionality """
@@ -8,10 +9,15 @@ class RecordToolbar(QToolBar):
     def __init__(self) -> None:
         super().__init__('Record')
 
-        self.add_record = self.addAction(QIcon(':record/add'), 'Add record')
-        self.edit_record = self.addAction(QIcon(':record/edit'), 'Edit record')
-        self.delete_record = self.addAction(QIcon(':record/delete'), 'Delete record')
+        self.add_record = self.addAction(icon(':record/add'), 'Add record')
+        self.edit_record = self.addAction(icon(':record/edit'), 'Edit record')
+        self.delete_record = self.addAction(icon(':record/delete'), 'Delete record')
+
+        self.addSeparator()
+
+        self.refresh = self.addAction(icon(':record/refresh'), 'Refresh')
 
         self.addSeparator()
 
-        self.refresh = self.addAction(QIcon(':record/refresh'), 'Refresh')
+        self.import_records = self.addAction(icon(':record/import'), 'Import records')
+        self.export_records = self.addAction(icon(':record/export'), 'Export records')